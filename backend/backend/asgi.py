@@ -13,17 +13,18 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from django.urls import path
 from core.socketio_server import socket_app
+from core.outbox import con_despachador
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DandD.settings')
 
 django_asgi_app = get_asgi_application()
 
-# Configura Channels con Socket.io
-application = ProtocolTypeRouter({
+# Configura Channels con Socket.io; el despachador del outbox arranca con la primera conexión
+application = con_despachador(ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter([
             path("socket.io/", socket_app),
         ])
     ),
-})
+}))
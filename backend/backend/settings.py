@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,6 +48,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.instrumentacion.InstrumentarPeticiones',
     'core.middleware.noCacheMiddleware.DisableAPICache',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,15 +58,29 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Autenticación JWT sin estado (core.autenticacion): el usuario sale de los
+# claims del token y no se carga de la base en las lecturas. Los claims con
+# más de JWT_SIN_ESTADO_FRESCURA segundos fuerzan la carga del usuario.
+JWT_SIN_ESTADO = os.environ.get('JWT_SIN_ESTADO', '') == '1'
+JWT_SIN_ESTADO_FRESCURA = 300
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.autenticacion.JWTSinEstadoAuthentication' if JWT_SIN_ESTADO
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
 }
 
+# Tamaño de página de los listados que usan core.pagination.IdCursorPagination
+# (pedidos, órdenes, clientes, usuarios e ítems del menú); el resto no pagina.
+# Va fuera de REST_FRAMEWORK porque no hay paginación por defecto.
+API_PAGE_SIZE = 100
+# Máximo que un cliente puede pedir con ?page_size= en los listados paginados
+API_MAX_PAGE_SIZE = 500
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
@@ -80,6 +96,40 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    # Agregan username, grupos e is_superuser para JWT_SIN_ESTADO
+    'TOKEN_OBTAIN_SERIALIZER': 'core.autenticacion.TokenConRolesSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'core.autenticacion.TokenRefrescoConRolesSerializer',
+}
+
+# Registro estructurado por cola (core.registro). Niveles por logger; se
+# pueden ajustar con REGISTRO_NIVELES="core=DEBUG,engineio.server=INFO".
+from core.registro import niveles_desde_entorno
+
+REGISTRO_NIVELES = niveles_desde_entorno(os.environ.get('REGISTRO_NIVELES'), {
+    'core': 'INFO',
+    'django': 'INFO',
+    'django.db.backends': 'WARNING',
+    'socketio.server': 'INFO',
+    'engineio.server': 'WARNING',
+})
+
+# Logs de paquetes de alto volumen: se escribe uno de cada N registros DEBUG/INFO
+REGISTRO_MUESTREO = {
+    'socketio.server': 10,
+    'engineio.server': 100,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'muestreo': {'()': 'core.registro.Muestreo', 'cada': REGISTRO_MUESTREO},
+    },
+    'handlers': {
+        'cola': {'()': 'core.registro.ManejadorCola', 'filters': ['muestreo']},
+    },
+    'root': {'handlers': ['cola'], 'level': 'WARNING'},
+    'loggers': {nombre: {'level': nivel} for nombre, nivel in REGISTRO_NIVELES.items()},
 }
 
 ASGI_APPLICATION = 'DandD.asgi.application'
@@ -139,6 +189,90 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# La caché `dashboard` guarda los resultados de los endpoints de dashboard
+# (core.dashboard) junto con la versión que los invalida. Por defecto es local
+# al proceso, lo que solo sirve con un único worker: con varios, cada proceso
+# vería subir únicamente su propia versión y seguiría sirviendo resultados
+# viejos hasta DASHBOARD_CACHE_TTL. En ese caso hay que definir
+# DASHBOARD_CACHE_DIR (backend de archivos compartido por los procesos del
+# mismo host) o apuntar CACHES['dashboard'] a Redis o Memcached para varios nodos.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'dashboard': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dashboard',
+    },
+    # Cuerpos ya renderizados de los endpoints de catálogo, por versión
+    'catalogo': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalogo',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+if os.environ.get('DASHBOARD_CACHE_DIR'):
+    CACHES['dashboard'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['DASHBOARD_CACHE_DIR'],
+    }
+
+# Segundos que un resultado de dashboard permanece en caché aunque no cambien los datos
+DASHBOARD_CACHE_TTL = 60
+
+# Segundos entre comprobaciones de la versión compartida del catálogo en
+# memoria (core.catalogo). Los cambios hechos en el mismo proceso se ven al
+# instante; los de otros procesos, como mucho tras este intervalo.
+CATALOGO_REVISION = 1.0
+
+# Igual para la caché de grupos y permisos por usuario (core.roles), que
+# además guarda como mucho ROLES_MAXIMO usuarios (descarta los menos usados)
+ROLES_REVISION = 1.0
+ROLES_MAXIMO = 10000
+
+# Días que se conservan las lápidas de pedidos y órdenes borrados (core.sync).
+# Un cliente con un token más viejo recibe una sincronización completa.
+SYNC_RETENCION_LAPIDAS = 30
+
+# Client manager de Socket.IO (core.socketio_managers). 'memoria' sirve para un
+# solo proceso; con varios workers usar 'local' (mismo host, URL = directorio
+# de sockets) o 'redis'/'amqp' (URL del broker) para varios nodos.
+SOCKETIO_MANAGER = {
+    'BACKEND': os.environ.get('SOCKETIO_MANAGER', 'memoria'),
+    'URL': os.environ.get('SOCKETIO_MANAGER_URL', ''),
+    'CANAL': os.environ.get('SOCKETIO_MANAGER_CANAL', 'dandd'),
+}
+
+# Ventana (ms) de la entrega agrupada de actualizaciones de órdenes para los
+# clientes que declaran la capacidad 'ordenes_actualizadas' (core.agrupacion).
+# Con 0 todos los clientes reciben eventos individuales.
+SOCKETIO_AGRUPACION_MS = 50
+
+# Handshake de Socket.IO (core.handshake): segundos y cantidad máxima de
+# sesiones verificadas en caché por token, e hilos y lecturas pendientes del
+# executor que consulta usuarios durante una ola de reconexiones.
+SOCKETIO_SESION_TTL = 60
+SOCKETIO_SESION_MAXIMO = 5000
+SOCKETIO_HANDSHAKE_HILOS = 4
+SOCKETIO_HANDSHAKE_COLA = 200
+
+# Outbox de eventos de Socket.IO (core.outbox). El despachador corre en el
+# proceso ASGI; fuera de él los eventos quedan en la tabla hasta que alguno
+# los publique (ver el comando despachar_eventos).
+OUTBOX_DESPACHADOR = os.environ.get('OUTBOX_DESPACHADOR', '1') == '1'
+OUTBOX_LOTE = 100                 # eventos por lote
+OUTBOX_INTERVALO = 1.0            # segundos entre sondeos si nadie avisa
+OUTBOX_MAX_INTENTOS = 5
+OUTBOX_ESPERA_REINTENTO = 0.5     # segundos antes del primer reintento (luego se duplica)
+OUTBOX_RESERVA = 30               # segundos que un despachador se reserva un lote
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -175,6 +309,19 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Instrumentación de /core/ (core.middleware.instrumentacion): cabecera
+# Server-Timing, histogramas por ruta en /core/metrics/ y un warning
+# 'peticion_lenta' con las INSTRUMENTACION_SQL_TOP sentencias más repetidas
+# cuando la petición tarda más de INSTRUMENTACION_LENTA_MS (None lo apaga).
+# Server-Timing revela tiempos y cantidad de consultas: sin
+# INSTRUMENTACION_SERVER_TIMING solo la reciben staff y el token de métricas.
+INSTRUMENTACION_SERVER_TIMING = DEBUG
+INSTRUMENTACION_LENTA_MS = 500
+INSTRUMENTACION_SQL_TOP = 5
+# Token para que Prometheus lea /core/metrics/ con la cabecera X-Metricas-Token
+# (sin token, solo gerentes y administradores autenticados)
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
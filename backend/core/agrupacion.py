@@ -0,0 +1,66 @@
+"""
+Entrega agrupada de eventos de Socket.IO.
+
+Los clientes que declaran la capacidad 'ordenes_actualizadas' al conectarse
+entran a las versiones "#lote" de sus salas. Para ellos, las actualizaciones
+de órdenes se acumulan durante SOCKETIO_AGRUPACION_MS milisegundos, cada
+orden conserva solo su último estado, y al cerrar la ventana cada sala
+destino recibe un único evento 'ordenes_actualizadas' con todas sus órdenes:
+'cocina#lote' recibe un paquete por ventana aunque cambien órdenes de muchos
+pedidos. Las salas con exactamente la misma lista comparten el emit, así que
+un socket que está en varias de ellas la recibe una sola vez (el client
+manager no repite destinatarios dentro de un emit). Los clientes antiguos
+siguen en las salas normales y reciben un 'orden_actualizada' por cambio.
+"""
+import asyncio
+
+from . import metricas
+
+CAPACIDAD = 'ordenes_actualizadas'
+
+# Evento individual -> evento agrupado que lo reemplaza para los clientes con la capacidad
+AGRUPABLES = {'orden_actualizada': 'ordenes_actualizadas'}
+
+
+def sala_lote(sala):
+    return f'{sala}#lote'
+
+
+class AgrupadorEventos:
+    def __init__(self, sio, ventana):
+        self.sio = sio
+        self.ventana = ventana
+        self.pendientes = {}   # evento -> {id: (salas, payload)}
+        self._tarea = None
+
+    def agregar(self, evento, salas, data):
+        """Acumula un payload; debe llamarse desde el loop que envía los eventos"""
+        payloads = self.pendientes.setdefault(evento, {})
+        # Reinsertar para que la lista quede en el orden del último cambio
+        payloads.pop(data['id'], None)
+        payloads[data['id']] = (tuple(salas), data)
+        if self._tarea is None:
+            self._tarea = asyncio.ensure_future(self._vaciar_luego())
+
+    async def _vaciar_luego(self):
+        await asyncio.sleep(self.ventana)
+        await self.vaciar()
+
+    async def vaciar(self):
+        """Envía todo lo acumulado: un evento por sala destino"""
+        pendientes, self.pendientes = self.pendientes, {}
+        tarea, self._tarea = self._tarea, None
+        if tarea is not None and tarea is not asyncio.current_task():
+            tarea.cancel()
+        for evento, payloads in pendientes.items():
+            por_sala = {}
+            for salas, data in payloads.values():
+                for sala in salas:
+                    por_sala.setdefault(sala, []).append(data)
+            envios = {}   # ids de la lista -> (lista, salas "#lote" que la reciben)
+            for sala, datos in por_sala.items():
+                clave = tuple(data['id'] for data in datos)
+                envios.setdefault(clave, (datos, []))[1].append(sala_lote(sala))
+            for datos, lote in envios.values():
+                metricas.observar_emision(self.sio.manager, evento, lote)
+                await self.sio.emit(evento, datos, to=lote)
@@ -0,0 +1,101 @@
+"""
+Autenticación JWT sin estado (opcional, JWT_SIN_ESTADO en settings).
+
+JWTAuthentication verifica la firma y luego carga la fila User en cada
+petición. Con JWTSinEstadoAuthentication, el usuario se construye con los
+claims firmados que TokenConRolesSerializer agrega al emitir el token (id,
+username, grupos, is_superuser y el momento en que se resolvieron; el
+refresco los vuelve a resolver), sin consultar la base. Los permisos se siguen resolviendo con core.roles, que
+los guarda en caché por usuario.
+
+Se carga el User completo solo cuando:
+  - la petición es de escritura, salvo las acciones que la vista marque con
+    False en `usuario_completo` (dict acción -> bool), o es una acción que la
+    vista marque con True (p. ej. `me`, que serializa el usuario);
+  - los claims tienen más de JWT_SIN_ESTADO_FRESCURA segundos, así un cambio
+    de grupos o una baja se nota como mucho tras ese plazo;
+  - el token no trae los claims (emitido antes de activar el modo).
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils.functional import cached_property
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import roles
+
+CLAIM_GRUPOS = 'grupos'
+CLAIM_RESUELTO = 'roles_en'
+
+
+def agregar_claims(token, user):
+    token['username'] = user.get_username()
+    token[CLAIM_GRUPOS] = sorted(roles.de_usuario(user).grupos)
+    token['is_superuser'] = user.is_superuser
+    token[CLAIM_RESUELTO] = int(time.time())
+
+
+class TokenConRolesSerializer(TokenObtainPairSerializer):
+    """Emite tokens con los claims que usa JWTSinEstadoAuthentication"""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        agregar_claims(token, user)
+        return token
+
+
+class TokenRefrescoConRolesSerializer(TokenRefreshSerializer):
+    """Al refrescar, vuelve a resolver los claims para que el access token nazca fresco"""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        user = User.objects.filter(id=access[api_settings.USER_ID_CLAIM]).first()
+        if user is not None:
+            agregar_claims(access, user)
+            data['access'] = str(access)
+        return data
+
+
+class UsuarioToken(TokenUser):
+    """Usuario liviano respaldado por los claims del token"""
+
+    @cached_property
+    def grupos(self):
+        return frozenset(self.token.get(CLAIM_GRUPOS, ()))
+
+
+def _usuario_completo_requerido(request):
+    view = request.parser_context.get('view') if request.parser_context else None
+    por_accion = getattr(view, 'usuario_completo', {})
+    accion = getattr(view, 'action', None)
+    if accion in por_accion:
+        return por_accion[accion]
+    return request.method not in SAFE_METHODS
+
+
+class JWTSinEstadoAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        resuelto = validated_token.get(CLAIM_RESUELTO)
+        if (
+            resuelto is None
+            or time.time() - resuelto > settings.JWT_SIN_ESTADO_FRESCURA
+            or _usuario_completo_requerido(request)
+        ):
+            return self.get_user(validated_token), validated_token
+        return UsuarioToken(validated_token), validated_token
@@ -0,0 +1,184 @@
+"""
+Caché por proceso de los catálogos: Estado, Mesa, Componente y MenuItem.
+
+Son tablas pequeñas que casi no cambian pero se consultan en cada cambio de
+estado, cada alta de pedido y cada payload de socket. Se cargan completas una
+vez (cinco consultas) en registros con __slots__ y se sirven desde memoria.
+
+Las señales de core.signals llaman a `invalidar()` en cada post_save,
+post_delete o m2m_changed de estos modelos: se descarta la copia local y se
+sube un contador compartido en la base (ContadorCambios id=2). Los demás
+procesos comparan ese contador como mucho cada CATALOGO_REVISION segundos y
+recargan si cambió. La versión y su fecha (`marca()`) sirven además de
+validadores HTTP para los endpoints de catálogo, incluido el de grupos.
+Las escrituras que no pasan por señales (bulk_create, update) deben llamar a
+`invalidar()` a mano.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Componente, ContadorCambios, Estado, MenuItem, Mesa
+
+# Fila de ContadorCambios con la versión del catálogo (la 1 es la de core.sync)
+ID_CONTADOR = 2
+
+
+class EstadoRegistro:
+    __slots__ = ('id', 'nombre')
+
+    def __init__(self, id, nombre):
+        self.id = id
+        self.nombre = nombre
+
+    @property
+    def terminado(self):
+        return self.nombre in Estado.TERMINADOS
+
+
+class MesaRegistro:
+    __slots__ = ('id', 'numero')
+
+    def __init__(self, id, numero):
+        self.id = id
+        self.numero = numero
+
+
+class ComponenteRegistro:
+    __slots__ = ('id', 'nombre')
+
+    def __init__(self, id, nombre):
+        self.id = id
+        self.nombre = nombre
+
+
+class MenuItemRegistro:
+    __slots__ = ('id', 'nombre', 'precio', 'descripcion', 'componentes')
+
+    def __init__(self, id, nombre, precio, descripcion, componentes):
+        self.id = id
+        self.nombre = nombre
+        self.precio = precio
+        self.descripcion = descripcion
+        self.componentes = componentes   # tupla de ids, ordenada
+
+
+class _Datos:
+    __slots__ = ('version', 'estados', 'mesas', 'componentes', 'menu_items', 'estados_por_nombre')
+
+    def __init__(self, version):
+        self.version = version
+        self.estados = {
+            fila['id']: EstadoRegistro(**fila) for fila in Estado.objects.order_by('id').values('id', 'nombre')
+        }
+        self.mesas = {
+            fila['id']: MesaRegistro(**fila) for fila in Mesa.objects.order_by('id').values('id', 'numero')
+        }
+        self.componentes = {
+            fila['id']: ComponenteRegistro(**fila) for fila in Componente.objects.order_by('id').values('id', 'nombre')
+        }
+        through = MenuItem.componentes.through
+        componentes_por_item = {}
+        for menu_item_id, componente_id in through.objects.order_by('componente_id').values_list('menuitem_id', 'componente_id'):
+            componentes_por_item.setdefault(menu_item_id, []).append(componente_id)
+        self.menu_items = {
+            fila['id']: MenuItemRegistro(componentes=tuple(componentes_por_item.get(fila['id'], ())), **fila)
+            for fila in MenuItem.objects.order_by('id').values('id', 'nombre', 'precio', 'descripcion')
+        }
+        self.estados_por_nombre = {}
+        for estado in self.estados.values():
+            self.estados_por_nombre.setdefault(estado.nombre, estado)
+
+
+_datos = None
+_marca = None      # (versión, actualizado) leída de la base
+_revisado = 0.0
+_lock = threading.Lock()
+
+
+def _version_compartida():
+    return ContadorCambios.objects.filter(id=ID_CONTADOR).values_list('valor', 'actualizado').first() or (0, None)
+
+
+def _marca_vigente():
+    """Versión compartida, releída como mucho cada CATALOGO_REVISION segundos"""
+    global _marca, _revisado
+    ahora = time.monotonic()
+    marca = _marca
+    if marca is None or ahora - _revisado >= settings.CATALOGO_REVISION:
+        marca = _version_compartida()
+        _marca, _revisado = marca, ahora
+    return marca
+
+
+def _vigentes():
+    global _datos
+    # Leer la versión antes que las filas: un cambio posterior forzará otra recarga
+    version = _marca_vigente()[0]
+    datos = _datos
+    if datos is not None and datos.version == version:
+        return datos
+    with _lock:
+        if _datos is None or _datos.version != version:
+            _datos = _Datos(version)
+        return _datos
+
+
+def _descartar():
+    global _datos, _marca
+    _marca = None
+    _datos = None
+
+
+def invalidar():
+    """Descarta la copia de este proceso y avisa a los demás subiendo la versión compartida"""
+    ahora = timezone.now()
+    if not ContadorCambios.objects.filter(id=ID_CONTADOR).update(valor=F('valor') + 1, actualizado=ahora):
+        ContadorCambios.objects.get_or_create(id=ID_CONTADOR, defaults={'valor': 1, 'actualizado': ahora})
+    _descartar()
+    # Otro hilo pudo recargar antes del commit con los datos viejos
+    transaction.on_commit(_descartar)
+
+
+def version():
+    return _marca_vigente()[0]
+
+
+def marca():
+    """(versión, fecha de la última invalidación o None) sin cargar los datos"""
+    return _marca_vigente()
+
+
+def estado(estado_id):
+    try:
+        return _vigentes().estados.get(int(estado_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def estado_por_nombre(nombre):
+    return _vigentes().estados_por_nombre.get(nombre)
+
+
+def estados():
+    return list(_vigentes().estados.values())
+
+
+def mesa(mesa_id):
+    return _vigentes().mesas.get(mesa_id)
+
+
+def componente(componente_id):
+    return _vigentes().componentes.get(componente_id)
+
+
+def menu_item(menu_item_id):
+    return _vigentes().menu_items.get(menu_item_id)
+
+
+def menu_items():
+    return list(_vigentes().menu_items.values())
@@ -0,0 +1,124 @@
+"""
+Capa común de los dashboards: período → rango de fechas, verificación de
+permisos y caché de resultados compartida entre peticiones.
+
+Los resultados se guardan en la caché `dashboard` (ver CACHES en settings)
+por (endpoint, parámetros). Cada entrada expira tras DASHBOARD_CACHE_TTL
+segundos y además queda invalidada al subir la versión global, lo que hacen
+las señales de core.signals cada vez que se escribe un Pedido o una Orden.
+La versión vive en la propia caché: con varios workers la caché tiene que ser
+compartida o cada proceso seguiría sirviendo sus resultados viejos.
+"""
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .permissions import IsGerente
+
+PERIODOS = {'dia': 1, 'semana': 7, 'mes': 30, 'trimestre': 90}
+PERIODO_POR_DEFECTO = 'semana'
+
+CACHE_ALIAS = 'dashboard'
+CLAVE_VERSION = 'dashboard:version'
+
+# Un lock por clave para que peticiones simultáneas del mismo proceso calculen una sola vez
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def dias_atras(periodo):
+    """Número de días que cubre un período del dashboard"""
+    return PERIODOS.get(periodo, PERIODOS[PERIODO_POR_DEFECTO])
+
+
+def fecha_inicio(periodo):
+    """Primer día (inclusive) del período terminado hoy"""
+    return timezone.localdate() - timedelta(days=dias_atras(periodo))
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def version_actual():
+    version = _cache().get(CLAVE_VERSION)
+    if version is None:
+        _cache().add(CLAVE_VERSION, 1, timeout=None)
+        version = _cache().get(CLAVE_VERSION, 1)
+    return version
+
+
+def _subir_version():
+    cache = _cache()
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.add(CLAVE_VERSION, 2, timeout=None)
+
+
+def invalidar():
+    """Sube la versión de los resultados cacheados; las entradas anteriores dejan de usarse"""
+    _subir_version()
+    # Otra petición pudo recalcular y guardar con los datos previos al commit
+    transaction.on_commit(_subir_version)
+
+
+def _clave(endpoint, parametros):
+    partes = ':'.join(f"{nombre}={parametros[nombre]}" for nombre in sorted(parametros))
+    return f"dashboard:{endpoint}:{partes}"
+
+
+def obtener_o_calcular(endpoint, parametros, calcular):
+    """Devuelve el resultado cacheado para (endpoint, parámetros) o lo calcula y lo guarda"""
+    cache = _cache()
+    clave = _clave(endpoint, parametros)
+    version = version_actual()
+    resultado = cache.get(clave, version=version)
+    if resultado is not None:
+        return resultado
+
+    with _locks_guard:
+        if len(_locks) > 1000:
+            _locks.clear()
+        lock = _locks.setdefault(clave, threading.Lock())
+    with lock:
+        # Otro hilo pudo haberlo calculado mientras esperábamos
+        resultado = cache.get(clave, version=version)
+        if resultado is None:
+            resultado = calcular()
+            cache.set(clave, resultado, timeout=settings.DASHBOARD_CACHE_TTL, version=version)
+    return resultado
+
+
+class DashboardAPIView(APIView):
+    """
+    Base de los endpoints de dashboard. Las subclases definen `endpoint`,
+    `parametros(query_params)` (puede lanzar ValueError) y `calcular(**parametros)`.
+    """
+    # Solo gerentes y administradores (grupos resueltos por core.roles, sin consultas)
+    permission_classes = [permissions.IsAuthenticated, IsGerente]
+    endpoint = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Falla al importar, no en la primera petición
+        if not cls.endpoint or not callable(getattr(cls, 'calcular', None)):
+            raise TypeError(f"{cls.__name__} debe definir `endpoint` y `calcular(**parametros)`")
+
+    def get(self, request):
+        try:
+            parametros = self.parametros(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(obtener_o_calcular(self.endpoint, parametros, lambda: self.calcular(**parametros)))
+
+    def parametros(self, query_params):
+        return {'desde': fecha_inicio(query_params.get('periodo', PERIODO_POR_DEFECTO))}
@@ -0,0 +1,191 @@
+"""
+Autenticación del handshake de Socket.IO.
+
+Cuando se corta el Wi-Fi todas las tablets se reconectan a la vez. Para no
+mandar cada handshake por el pool de hilos de database_sync_to_async:
+
+  - la firma, la expiración y el tipo del token se verifican dentro del loop
+    (AccessToken no toca la base);
+  - la sesión resultante se guarda en una caché LRU con TTL por token
+    (SOCKETIO_SESION_TTL, nunca más allá de la expiración del token), así una
+    reconexión con el mismo token no hace ninguna consulta;
+  - con JWT_SIN_ESTADO, los claims frescos del token (core.autenticacion)
+    alcanzan para armar la sesión;
+  - si hace falta leer el usuario, se usa un executor propio de
+    SOCKETIO_HANDSHAKE_HILOS hilos con a lo sumo SOCKETIO_HANDSHAKE_COLA
+    lecturas pendientes; las de un mismo usuario se comparten. Con la cola
+    llena el handshake se rechaza y el cliente reintenta.
+
+Los cambios de grupos o bajas se notan en los sockets nuevos como mucho tras
+SOCKETIO_SESION_TTL segundos.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import roles
+from .autenticacion import CLAIM_GRUPOS, CLAIM_RESUELTO
+from .outbox import Histograma
+from .registro import campos
+
+logger = logging.getLogger(__name__)
+
+# Límites (en segundos) del histograma de latencia del handshake
+BUCKETS_HANDSHAKE = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+metricas = {
+    'aceptados': 0,
+    'rechazados': 0,
+    'desde_cache': 0,
+    'consultas': 0,
+    'saturado': 0,
+    'latencia': Histograma(BUCKETS_HANDSHAKE),
+}
+
+
+class CacheSesiones:
+    """LRU acotada token -> sesión con vencimiento; solo se usa desde el loop"""
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self._datos = OrderedDict()
+
+    def obtener(self, token):
+        entrada = self._datos.get(token)
+        if entrada is None:
+            return None
+        vence, sesion = entrada
+        if vence <= time.monotonic():
+            del self._datos[token]
+            return None
+        self._datos.move_to_end(token)
+        return sesion
+
+    def guardar(self, token, sesion, ttl):
+        self._datos[token] = (time.monotonic() + ttl, sesion)
+        self._datos.move_to_end(token)
+        while len(self._datos) > self.maximo:
+            self._datos.popitem(last=False)
+
+    def vaciar(self):
+        self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+
+cache = CacheSesiones(settings.SOCKETIO_SESION_MAXIMO)
+
+_ejecutor = None
+_pendientes = 0
+_en_vuelo = {}   # user_id -> future de la lectura en curso
+
+
+def _sesion(user_id, username, grupos, is_superuser):
+    return {
+        'user_id': str(user_id),
+        'username': username,
+        'grupos': sorted(grupos),
+        'is_superuser': is_superuser,
+    }
+
+
+def _cargar_sesion(user_id):
+    """Corre en el executor: lee el usuario y sus grupos"""
+    close_old_connections()
+    try:
+        user = User.objects.filter(id=user_id, is_active=True).first()
+        if user is None:
+            return None
+        return _sesion(user.id, user.username, roles.de_usuario(user).grupos, user.is_superuser)
+    finally:
+        close_old_connections()
+
+
+def _obtener_ejecutor():
+    global _ejecutor
+    if _ejecutor is None:
+        _ejecutor = ThreadPoolExecutor(max_workers=settings.SOCKETIO_HANDSHAKE_HILOS, thread_name_prefix='handshake')
+    return _ejecutor
+
+
+def _terminar(user_id):
+    global _pendientes
+    _pendientes -= 1
+    _en_vuelo.pop(user_id, None)
+
+
+async def _consultar(user_id):
+    global _pendientes
+    futuro = _en_vuelo.get(user_id)
+    if futuro is None:
+        if _pendientes >= settings.SOCKETIO_HANDSHAKE_COLA:
+            metricas['saturado'] += 1
+            logger.warning('handshake_saturado', extra=campos(pendientes=_pendientes, usuario=user_id))
+            return None
+        _pendientes += 1
+        metricas['consultas'] += 1
+        futuro = asyncio.get_running_loop().run_in_executor(_obtener_ejecutor(), _cargar_sesion, user_id)
+        _en_vuelo[user_id] = futuro
+        futuro.add_done_callback(lambda _: _terminar(user_id))
+    # Si este handshake se cancela, la lectura sigue para los demás que la esperan
+    return await asyncio.shield(futuro)
+
+
+def _claims_frescos(token):
+    resuelto = token.get(CLAIM_RESUELTO)
+    return (
+        settings.JWT_SIN_ESTADO
+        and resuelto is not None
+        and time.time() - resuelto <= settings.JWT_SIN_ESTADO_FRESCURA
+    )
+
+
+async def _autenticar(token):
+    if not isinstance(token, str):
+        return None
+    sesion = cache.obtener(token)
+    if sesion is not None:
+        metricas['desde_cache'] += 1
+        return sesion
+
+    try:
+        validado = AccessToken(token)
+    except TokenError:
+        return None
+    user_id = validado.get(api_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return None
+
+    ttl = min(settings.SOCKETIO_SESION_TTL, validado['exp'] - time.time())
+    if _claims_frescos(validado):
+        sesion = _sesion(user_id, validado.get('username', ''), validado.get(CLAIM_GRUPOS, ()),
+                         validado.get('is_superuser', False))
+        ttl = min(ttl, validado[CLAIM_RESUELTO] + settings.JWT_SIN_ESTADO_FRESCURA - time.time())
+    else:
+        sesion = await _consultar(user_id)
+    if sesion is not None and ttl > 0:
+        cache.guardar(token, sesion, ttl)
+    return sesion
+
+
+async def autenticar(token):
+    """Sesión de socket para el token (copia que el llamador puede modificar) o None"""
+    inicio = time.perf_counter()
+    try:
+        sesion = await _autenticar(token)
+    except Exception:
+        logger.exception('error_handshake')
+        sesion = None
+    metricas['latencia'].observar(time.perf_counter() - inicio)
+    metricas['aceptados' if sesion is not None else 'rechazados'] += 1
+    return dict(sesion) if sesion is not None else None
@@ -0,0 +1,76 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Componente, MenuItem, Estado, Mesa, Pedido, Orden
+from core.serializers import MenuItemDetailSerializer, OrdenSerializer, PedidoSerializer
+from core.values_serializers import MenuItemValuesSerializer, OrdenValuesSerializer, PedidoValuesSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compara el listado con ModelSerializer contra el camino rápido basado en values()'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=2000, help='Filas sintéticas por modelo')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Repeticiones por medición')
+
+    def handle(self, *args, **options):
+        filas = options['filas']
+        repeticiones = options['repeticiones']
+
+        # Los datos sintéticos se descartan al terminar
+        with transaction.atomic():
+            self._crear_datos(filas)
+            casos = [
+                ('ordenes', OrdenSerializer, OrdenValuesSerializer, Orden.objects.order_by('id')),
+                ('pedidos', PedidoSerializer, PedidoValuesSerializer, Pedido.objects.order_by('id')),
+                ('menu-items', MenuItemDetailSerializer, MenuItemValuesSerializer, MenuItem.objects.order_by('id').prefetch_related(
+                    Prefetch('componentes', queryset=Componente.objects.order_by('id'))
+                )),
+            ]
+            renderer = JSONRenderer()
+            for nombre, serializer_class, values_class, queryset in casos:
+                lento = self._medir(repeticiones, lambda: renderer.render(serializer_class(queryset.all(), many=True).data))
+                values_serializer = values_class()
+                rapido = self._medir(repeticiones, lambda: renderer.render(
+                    values_serializer.serializar(values_serializer.valores(queryset.all()))
+                ))
+                self.stdout.write(
+                    f"{nombre:<12} serializer: {lento * 1000:8.1f} ms   values(): {rapido * 1000:8.1f} ms   "
+                    f"x{lento / rapido if rapido else 0:.1f}"
+                )
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS(f"Benchmark completado con {filas} filas por modelo"))
+
+    def _medir(self, repeticiones, funcion):
+        """Mejor tiempo de `repeticiones` ejecuciones, en segundos"""
+        mejor = None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            duracion = time.perf_counter() - inicio
+            mejor = duracion if mejor is None else min(mejor, duracion)
+        return mejor
+
+    def _crear_datos(self, filas):
+        usuario = get_user_model().objects.create(username='benchmark_listados')
+        mesa = Mesa.objects.create(numero=0)
+        estado = Estado.objects.create(nombre='Pendiente')
+        componentes = Componente.objects.bulk_create([Componente(nombre=f'comp{i}') for i in range(10)])
+        menu_items = MenuItem.objects.bulk_create([
+            MenuItem(nombre=f'item{i}', precio=i % 50 + 0.5, descripcion='benchmark') for i in range(filas)
+        ])
+        MenuItem.componentes.through.objects.bulk_create([
+            MenuItem.componentes.through(menuitem_id=item.id, componente_id=componentes[(i + j) % 10].id)
+            for i, item in enumerate(menu_items) for j in range(3)
+        ])
+        pedidos = Pedido.objects.bulk_create([Pedido(usuario=usuario, mesa=mesa) for _ in range(filas)])
+        Orden.objects.bulk_create([
+            Orden(pedido=pedidos[i], menu_item=menu_items[i], estado=estado, precio_unitario=menu_items[i].precio)
+            for i in range(filas)
+        ])
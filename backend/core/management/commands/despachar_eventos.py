@@ -0,0 +1,34 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from core.outbox import Despachador
+from core.socketio_server import agrupador
+
+
+class Command(BaseCommand):
+    help = (
+        'Publica los eventos pendientes del outbox de Socket.IO. Útil cuando el '
+        'servidor no corre bajo ASGI o con un client manager compartido (local/redis)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Vacía los pendientes y termina en lugar de quedarse escuchando')
+
+    def handle(self, *args, **options):
+        despachador = Despachador()
+        if not options['una_vez']:
+            asyncio.run(despachador.ejecutar())
+            return
+
+        async def vaciar():
+            total = 0
+            while procesados := await despachador.procesar_lote():
+                total += procesados
+            # No dejar actualizaciones agrupadas sin enviar al terminar
+            await agrupador.vaciar()
+            return total
+
+        total = asyncio.run(vaciar())
+        self.stdout.write(self.style.SUCCESS(f"Eventos procesados: {total}"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import sync
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra las lápidas de sincronización más viejas que la retención. Los '
+        'clientes con un token anterior reciben luego una sincronización completa'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, help='Días a conservar (por defecto SYNC_RETENCION_LAPIDAS)')
+
+    def handle(self, *args, **options):
+        if options['dias'] is not None and options['dias'] < 0:
+            raise CommandError("'dias' no puede ser negativo")
+        borradas = sync.podar_lapidas(options['dias'])
+        self.stdout.write(self.style.SUCCESS(f"Lápidas borradas: {borradas}"))
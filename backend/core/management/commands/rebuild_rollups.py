@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import dashboard
+from core.rollups import reconstruir
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los rollups de ventas por hora a partir de Pedido y Orden'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial (AAAA-MM-DD), inclusive')
+        parser.add_argument('--hasta', help='Fecha final (AAAA-MM-DD), inclusive')
+
+    def handle(self, *args, **options):
+        desde = self._fecha(options['desde'], 'desde')
+        hasta = self._fecha(options['hasta'], 'hasta')
+        if desde and hasta and desde > hasta:
+            raise CommandError("'desde' no puede ser posterior a 'hasta'")
+
+        filas_ventas, filas_productos = reconstruir(desde, hasta)
+        dashboard.invalidar()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rollups reconstruidos: {filas_ventas} filas de ventas, {filas_productos} filas de productos"
+        ))
+
+    def _fecha(self, valor, nombre):
+        if not valor:
+            return None
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Fecha '{nombre}' inválida, formato esperado AAAA-MM-DD")
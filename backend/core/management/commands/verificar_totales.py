@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from core import dashboard, sync
+from core.models import Orden, Pedido
+from core.rollups import clave_pedido, recalcular_ventas
+
+
+def _suma_ordenes():
+    """Subconsulta con la suma de precio_unitario de las órdenes de cada pedido"""
+    suma = Orden.objects.filter(pedido=OuterRef('pk')).values('pedido').annotate(
+        suma=Sum('precio_unitario')
+    ).values('suma')
+    campo = DecimalField(max_digits=10, decimal_places=2)
+    return Coalesce(Subquery(suma, output_field=campo), Value(0, output_field=campo))
+
+
+def _desviados(pedidos):
+    return pedidos.annotate(esperado=_suma_ordenes()).exclude(
+        subtotal=F('esperado'), total=F('esperado')
+    ).order_by('id').values(
+        'id', 'subtotal', 'total', 'esperado', 'fecha_creacion', 'hora_creacion', 'usuario_id', 'mesa_id'
+    )
+
+
+class Command(BaseCommand):
+    help = 'Busca pedidos cuyo subtotal/total no coincide con la suma de sus órdenes y opcionalmente los repara'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reparar', action='store_true', help='Corrige los pedidos desviados')
+        parser.add_argument('--lote', type=int, default=500, help='Pedidos corregidos por UPDATE')
+
+    def handle(self, *args, **options):
+        ids = [fila['id'] for fila in _desviados(Pedido.objects.all())]
+        if not ids:
+            self.stdout.write(self.style.SUCCESS("Todos los totales coinciden con sus órdenes"))
+            return
+        if not options['reparar']:
+            self.stdout.write(self.style.WARNING(
+                f"{len(ids)} pedidos con totales desviados (primeros: {ids[:20]}). Usa --reparar para corregirlos"
+            ))
+            return
+
+        reparados = 0
+        for inicio in range(0, len(ids), options['lote']):
+            reparados += self._reparar(ids[inicio:inicio + options['lote']])
+        dashboard.invalidar()
+        self.stdout.write(self.style.SUCCESS(f"Pedidos reparados: {reparados}"))
+
+    def _reparar(self, ids):
+        with transaction.atomic():
+            # Releer con el lote bloqueado: las órdenes pudieron cambiar desde la búsqueda
+            filas = list(_desviados(Pedido.objects.select_for_update().filter(id__in=ids)))
+            if not filas:
+                return 0
+            esperado = Case(
+                *[When(id=fila['id'], then=Value(fila['esperado'])) for fila in filas],
+                output_field=DecimalField(max_digits=10, decimal_places=2)
+            )
+            # El UPDATE no pasa por las señales: versión y rollup de ventas a mano.
+            # El rollup se recalcula por bucket porque no sabemos si siguió al desvío o no
+            Pedido.objects.filter(id__in=[fila['id'] for fila in filas]).update(
+                subtotal=esperado,
+                total=esperado,
+                version=sync.versiones_por_id([fila['id'] for fila in filas])
+            )
+            buckets = {
+                tuple(sorted(clave.items()))
+                for clave in (
+                    clave_pedido(fila['fecha_creacion'], fila['hora_creacion'], fila['usuario_id'], fila['mesa_id'])
+                    for fila in filas
+                )
+                if clave is not None
+            }
+            recalcular_ventas(dict(bucket) for bucket in buckets)
+        return len(filas)
@@ -0,0 +1,272 @@
+"""
+Métricas del proceso en formato de texto de Prometheus (/core/metrics/).
+
+Las peticiones HTTP las mide core.middleware.instrumentacion dentro de
+`medir_peticion()` y las registra con `observar_peticion()`: por ruta (método
++ nombre de la URL) se acumulan histogramas de tiempo total, tiempo de base,
+tiempo de serialización y cantidad de consultas. Cada proceso exporta sus
+propios valores; con varios workers Prometheus los agrega por instancia.
+
+La serialización se mide con `medir_serializacion()` donde ocurre: el `.data`
+de los serializers de core (core.serializers.ModeloSerializer) y
+core.values_serializers. Solo cuenta el bloque exterior, y sin el tiempo de
+las consultas que se disparen dentro (querysets perezosos, prefetch).
+
+Del lado de Socket.IO (mismo proceso ASGI) se exportan las sesiones por sala,
+los handshakes (core.handshake), los eventos emitidos por tipo con su fan-out
+(`observar_emision()`) y la latencia commit → emit del outbox
+(core.outbox). `resumen_socket()` devuelve lo mismo como dict para el evento
+de administración 'metricas' de core.socketio_server.
+"""
+import contextvars
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+from . import handshake, outbox
+from .outbox import Histograma
+
+# Límites de los histogramas de tiempo (segundos) y de consultas por petición
+BUCKETS_PETICION = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+# Miembros de las salas destino por emisión
+BUCKETS_FANOUT = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class MetricasRuta:
+    __slots__ = ('total', 'db', 'serializacion', 'consultas')
+
+    def __init__(self):
+        self.total = Histograma(BUCKETS_PETICION)
+        self.db = Histograma(BUCKETS_PETICION)
+        self.serializacion = Histograma(BUCKETS_PETICION)
+        self.consultas = Histograma(BUCKETS_CONSULTAS)
+
+
+http = {}   # ruta -> MetricasRuta
+_lock = threading.Lock()
+
+_actual = contextvars.ContextVar('medicion', default=None)
+
+
+class Medicion:
+    __slots__ = ('consultas', 'db', 'serializacion', 'sql', '_profundidad')
+
+    def __init__(self):
+        self.consultas = 0
+        self.db = 0.0
+        self.serializacion = 0.0
+        self.sql = Counter()
+        self._profundidad = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper de Django: se llama por cada consulta de la conexión
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - inicio
+            self.consultas += 1
+            self.sql[sql] += 1
+
+
+@contextmanager
+def medir_peticion():
+    """Mide las consultas de todas las conexiones y la serialización dentro del bloque"""
+    medicion = Medicion()
+    token = _actual.set(medicion)
+    try:
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(medicion))
+            yield medicion
+    finally:
+        _actual.reset(token)
+
+
+@contextmanager
+def medir_serializacion():
+    """
+    Suma el tiempo del bloque a la serialización de la petición actual, sin
+    anidar y descontando el tiempo de base de datos que ocurra dentro
+    """
+    medicion = _actual.get()
+    if medicion is None or medicion._profundidad:
+        yield
+        return
+    medicion._profundidad += 1
+    inicio = time.perf_counter()
+    db = medicion.db
+    try:
+        yield
+    finally:
+        medicion.serializacion += time.perf_counter() - inicio - (medicion.db - db)
+        medicion._profundidad -= 1
+
+
+def observar_peticion(ruta, total, db, serializacion, consultas):
+    with _lock:
+        metricas = http.get(ruta)
+        if metricas is None:
+            metricas = http[ruta] = MetricasRuta()
+        metricas.total.observar(total)
+        metricas.db.observar(db)
+        metricas.serializacion.observar(serializacion)
+        metricas.consultas.observar(consultas)
+
+
+# Solo se modifican desde el loop de Socket.IO
+socket = {
+    'eventos': Counter(),   # evento -> emisiones
+    'fanout': Histograma(BUCKETS_FANOUT),
+}
+_manager = None   # client manager de Socket.IO, lo registra core.socketio_server
+
+
+def registrar_socket(manager):
+    global _manager
+    _manager = manager
+
+
+def observar_emision(manager, evento, salas):
+    """
+    Cuenta una emisión con su fan-out: la suma de miembros de `salas` en este
+    proceso. Un socket en dos de las salas cuenta dos veces; a cambio es un
+    len() por sala y no recorre los participantes en cada emisión.
+    """
+    miembros = manager.rooms.get('/', {})
+    socket['eventos'][evento] += 1
+    socket['fanout'].observar(sum(len(miembros.get(sala, ())) for sala in salas))
+
+
+def _tipo_sala(nombre):
+    """Etiqueta acotada: las salas por rol por nombre, las de mesa/pedido/usuario por tipo"""
+    base, lote, _ = nombre.partition('#lote')
+    if ':' in base:
+        base = base.partition(':')[0]
+    elif base not in ('cocina', 'salon', 'gerencia'):
+        return None   # la sala propia de cada sid
+    return base + lote
+
+
+def sesiones_por_sala():
+    """(conectados, {sala: sockets}) de este proceso"""
+    if _manager is None:
+        return 0, {}
+    salas = dict(_manager.rooms.get('/', {}))
+    conectados = len(salas.pop(None, ()))
+    por_tipo = Counter()
+    for nombre, miembros in salas.items():
+        tipo = _tipo_sala(nombre)
+        if tipo is not None:
+            por_tipo[tipo] += len(miembros)
+    return conectados, dict(sorted(por_tipo.items()))
+
+
+def _resumen(valores):
+    acumulado = 0
+    buckets = {}
+    for limite, cuenta in zip(valores.limites, valores.cuentas):
+        acumulado += cuenta
+        buckets[_numero(limite)] = acumulado
+    buckets['+Inf'] = valores.total
+    return {'total': valores.total, 'suma': valores.suma, 'buckets': buckets}
+
+
+def resumen_socket():
+    conectados, salas = sesiones_por_sala()
+    return {
+        'conectados': conectados,
+        'salas': salas,
+        'handshake': {
+            **{clave: valor for clave, valor in handshake.metricas.items() if clave != 'latencia'},
+            'latencia': _resumen(handshake.metricas['latencia']),
+        },
+        'eventos': dict(socket['eventos']),
+        'fanout': _resumen(socket['fanout']),
+        'outbox': {
+            **{clave: valor for clave, valor in outbox.metricas.items() if clave != 'latencia'},
+            'commit_emit': _resumen(outbox.metricas['latencia']),
+        },
+    }
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(etiquetas, **extra):
+    pares = {**etiquetas, **extra}
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{clave}="{_escapar(valor)}"' for clave, valor in pares.items()) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def histograma(nombre, ayuda, series):
+    """Líneas de un histograma; `series` es una lista de (etiquetas, Histograma)"""
+    lineas = [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} histogram']
+    for etiquetas, valores in series:
+        acumulado = 0
+        for limite, cuenta in zip(valores.limites, valores.cuentas):
+            acumulado += cuenta
+            lineas.append(f'{nombre}_bucket{_etiquetas(etiquetas, le=_numero(limite))} {acumulado}')
+        lineas.append(f'{nombre}_bucket{_etiquetas(etiquetas, le="+Inf")} {valores.total}')
+        lineas.append(f'{nombre}_sum{_etiquetas(etiquetas)} {_numero(valores.suma)}')
+        lineas.append(f'{nombre}_count{_etiquetas(etiquetas)} {valores.total}')
+    return lineas
+
+
+def simple(nombre, tipo, ayuda, series):
+    """Líneas de un counter o gauge; `series` es una lista de (etiquetas, valor)"""
+    lineas = [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}']
+    lineas.extend(f'{nombre}{_etiquetas(etiquetas)} {_numero(valor)}' for etiquetas, valor in series)
+    return lineas
+
+
+def exportar():
+    """Texto completo para Prometheus (formato 0.0.4)"""
+    with _lock:
+        rutas = sorted(http.items())
+        lineas = []
+        for nombre, campo, ayuda in (
+            ('core_http_peticion_segundos', 'total', 'Tiempo total de la petición'),
+            ('core_http_db_segundos', 'db', 'Tiempo en la base de datos por petición'),
+            ('core_http_serializacion_segundos', 'serializacion', 'Tiempo serializando por petición'),
+            ('core_http_consultas', 'consultas', 'Consultas SQL por petición'),
+        ):
+            lineas.extend(histograma(nombre, ayuda, [({'ruta': ruta}, getattr(m, campo)) for ruta, m in rutas]))
+    lineas.extend(_lineas_socket())
+    return '\n'.join(lineas) + '\n'
+
+
+def _lineas_socket():
+    conectados, salas = sesiones_por_sala()
+    hs = handshake.metricas
+    return [
+        *simple('core_socket_conectados', 'gauge', 'Sesiones de Socket.IO conectadas', [({}, conectados)]),
+        *simple('core_socket_sesiones_sala', 'gauge', 'Sesiones por sala (mesa/pedido/usuario por tipo)',
+                [({'sala': sala}, n) for sala, n in salas.items()]),
+        *simple('core_socket_handshakes_total', 'counter', 'Handshakes por resultado',
+                [({'resultado': 'aceptado'}, hs['aceptados']), ({'resultado': 'rechazado'}, hs['rechazados'])]),
+        *simple('core_socket_handshake_sesiones_total', 'counter', 'Sesiones resueltas por origen',
+                [({'origen': 'cache'}, hs['desde_cache']), ({'origen': 'base'}, hs['consultas'])]),
+        *simple('core_socket_handshake_saturado_total', 'counter', 'Handshakes rechazados con la cola llena',
+                [({}, hs['saturado'])]),
+        *histograma('core_socket_handshake_segundos', 'Latencia del handshake', [({}, hs['latencia'])]),
+        *simple('core_socket_eventos_total', 'counter', 'Eventos emitidos por tipo',
+                [({'evento': evento}, n) for evento, n in sorted(socket['eventos'].items())]),
+        *histograma('core_socket_fanout', 'Miembros de las salas destino por emisión', [({}, socket['fanout'])]),
+        *simple('core_outbox_eventos_total', 'counter', 'Eventos del outbox por resultado', [
+            ({'resultado': resultado}, outbox.metricas[resultado])
+            for resultado in ('publicados', 'reintentos', 'descartados')
+        ]),
+        *histograma('core_outbox_commit_emit_segundos', 'Tiempo desde el commit hasta la emisión',
+                    [({}, outbox.metricas['latencia'])]),
+    ]
@@ -0,0 +1,77 @@
+"""
+Instrumentación por petición de /core/: cantidad y tiempo de consultas SQL,
+tiempo de serialización y tiempo total, medidos con core.metricas.
+
+Los valores se acumulan en los histogramas por ruta de core.metricas
+(/core/metrics/) y, si la petición supera INSTRUMENTACION_LENTA_MS, se
+registra un warning con las sentencias SQL más repetidas: una misma consulta
+ejecutada N veces suele ser un N+1. La cabecera Server-Timing (visible en las
+herramientas del navegador) solo se agrega con INSTRUMENTACION_SERVER_TIMING
+o para quien puede leer las métricas: staff o el token de Prometheus.
+"""
+import logging
+import time
+
+from django.conf import settings
+
+from .. import metricas
+from ..permissions import TokenMetricas
+from ..registro import campos
+
+logger = logging.getLogger(__name__)
+
+
+def _ruta(request):
+    match = getattr(request, 'resolver_match', None)
+    return f"{request.method} {match.view_name if match else 'sin_ruta'}"
+
+
+def _ms(segundos):
+    return round(segundos * 1000, 1)
+
+
+def _muestra_tiempos(request):
+    if settings.INSTRUMENTACION_SERVER_TIMING:
+        return True
+    # DRF deja en la petición de Django el usuario que autenticó la vista
+    usuario = getattr(request, 'user', None)
+    return bool(usuario and usuario.is_staff) or TokenMetricas().has_permission(request, None)
+
+
+class InstrumentarPeticiones:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith('/core/'):
+            return self.get_response(request)
+
+        inicio = time.perf_counter()
+        with metricas.medir_peticion() as medicion:
+            response = self.get_response(request)
+            # Los cuerpos diferidos (TemplateResponse) se renderizan antes de salir
+            if hasattr(response, 'render') and callable(response.render):
+                response = response.render()
+        total = time.perf_counter() - inicio
+
+        if _muestra_tiempos(request):
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={_ms(medicion.db)};desc="{medicion.consultas} consultas"',
+                f'ser;dur={_ms(medicion.serializacion)}',
+                f'total;dur={_ms(total)}',
+            ))
+        ruta = _ruta(request)
+        metricas.observar_peticion(ruta, total, medicion.db, medicion.serializacion, medicion.consultas)
+
+        umbral = settings.INSTRUMENTACION_LENTA_MS
+        if umbral is not None and total * 1000 >= umbral:
+            repetidas = [
+                f'{veces}x {sql}' for sql, veces in medicion.sql.most_common(settings.INSTRUMENTACION_SQL_TOP)
+                if veces > 1
+            ]
+            logger.warning('peticion_lenta', extra=campos(
+                ruta=ruta, estado=response.status_code, total_ms=_ms(total), db_ms=_ms(medicion.db),
+                ser_ms=_ms(medicion.serializacion), consultas=medicion.consultas,
+                sql_repetidas=' | '.join(repetidas),
+            ))
+        return response
@@ -1,11 +1,16 @@
 class DisableAPICache:
+    """
+    Política por defecto de /core/: no guardar nada. Las vistas que definen su
+    propia política (los catálogos, ver CatalogoCacheMixin en core.views) ya
+    traen Cache-Control y se respetan.
+    """
     def __init__(self, get_response):
         self.get_response = get_response
         
     def __call__(self, request):
         response = self.get_response(request)
-        if request.path.startswith('/core/'):
+        if request.path.startswith('/core/') and not response.has_header("Cache-Control"):
             response["Cache-Control"] = "no-cache, no-store, must-revalidate"
             response["Pragma"] = "no-cache"
             response["Expires"] = "0"
-        return response
\ No newline at end of file
+        return response
@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-18 04:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenProductoHora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('hora', models.PositiveSmallIntegerField()),
+                ('cantidad_ordenes', models.IntegerField(default=0)),
+                ('total_ventas', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.menuitem')),
+                ('mesa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.mesa')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'hora', 'menu_item', 'usuario', 'mesa'), name='resumen_producto_hora_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenVentaHora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('hora', models.PositiveSmallIntegerField()),
+                ('cantidad_pedidos', models.IntegerField(default=0)),
+                ('total_ventas', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('mesa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.mesa')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'hora', 'usuario', 'mesa'), name='resumen_venta_hora_unico')],
+            },
+        ),
+    ]
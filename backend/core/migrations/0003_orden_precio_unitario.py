@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 04:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copiar_precios(apps, schema_editor):
+    """Rellena el precio de las órdenes existentes con el precio actual de su ítem"""
+    Orden = apps.get_model('core', 'Orden')
+    MenuItem = apps.get_model('core', 'MenuItem')
+    Orden.objects.update(
+        precio_unitario=Subquery(
+            MenuItem.objects.filter(id=OuterRef('menu_item_id')).values('precio')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_resumen_ventas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orden',
+            name='precio_unitario',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copiar_precios, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 04:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_orden_precio_unitario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orden',
+            index=models.Index(fields=['estado', 'hora_creacion'], name='orden_estado_hora_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['fecha_creacion', 'total'], name='pedido_fecha_total_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['usuario', 'fecha_creacion'], name='pedido_usuario_fecha_idx'),
+        ),
+    ]
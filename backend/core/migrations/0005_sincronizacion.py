@@ -0,0 +1,73 @@
+# Generated by Django 5.2 on 2026-10-18 04:12
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def asignar_versiones(apps, schema_editor):
+    """Da a las filas existentes versiones únicas (pedidos primero, luego órdenes)"""
+    Pedido = apps.get_model('core', 'Pedido')
+    Orden = apps.get_model('core', 'Orden')
+    ContadorCambios = apps.get_model('core', 'ContadorCambios')
+    max_pedido = Pedido.objects.aggregate(maximo=Max('id'))['maximo'] or 0
+    max_orden = Orden.objects.aggregate(maximo=Max('id'))['maximo'] or 0
+    Pedido.objects.update(version=F('id'), version_creacion=F('id'))
+    Orden.objects.update(version=F('id') + max_pedido, version_creacion=F('id') + max_pedido)
+    ContadorCambios.objects.create(id=1, valor=max_pedido + max_orden)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_indices_consultas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorCambios',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Eliminacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=20)),
+                ('objeto_id', models.IntegerField()),
+                ('version', models.BigIntegerField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='orden',
+            name='version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='orden',
+            name='version_creacion',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='version_creacion',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='orden',
+            index=models.Index(fields=['version'], name='orden_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['version'], name='pedido_version_idx'),
+        ),
+        migrations.RunPython(asignar_versiones, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 04:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_sincronizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoSocket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('evento', models.CharField(max_length=40)),
+                ('objeto_id', models.IntegerField()),
+                ('creado', models.DateTimeField(default=django.utils.timezone.now)),
+                ('disponible', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reservado_por', models.CharField(blank=True, default='', max_length=32)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('ultimo_error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['disponible', 'id'], name='evento_disponible_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_outbox_eventos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contadorcambios',
+            name='actualizado',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
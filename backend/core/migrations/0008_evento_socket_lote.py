@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 05:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_contador_actualizado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventosocket',
+            name='objeto_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 05:18
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_evento_socket_lote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eliminacion',
+            name='creado',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
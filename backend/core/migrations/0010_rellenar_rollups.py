@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+def rellenar_rollups(apps, schema_editor):
+    """Calcula los rollups de los pedidos que ya existían antes de las tablas de resumen"""
+    from core import rollups
+    rollups.reconstruir(modelos=tuple(
+        apps.get_model('core', nombre)
+        for nombre in ('Pedido', 'Orden', 'ResumenVentaHora', 'ResumenProductoHora')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_lapidas_retencion'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_rollups, migrations.RunPython.noop),
+    ]
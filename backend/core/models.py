@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 import uuid
 
 class Componente(models.Model):
@@ -25,6 +26,9 @@ class MenuItem(models.Model):
         return self.nombre
 
 class Estado(models.Model):
+    # Estados en los que una orden ya salió de la cola de cocina
+    TERMINADOS = ('Listo', 'Entregado')
+
     id = models.AutoField(primary_key=True)
     nombre = models.CharField(max_length=30)
 
@@ -47,7 +51,20 @@ class Cliente(models.Model):
     def __str__(self):
         return self.nombre
 
-class Pedido(models.Model):
+class ConVersion(models.Model):
+    """
+    Modelos con versión de sincronización (core.sync). La versión se toma en
+    pre_save (core.signals) y el guardado corre en una transacción, así el
+    contador y la fila se confirman juntos.
+    """
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+class Pedido(ConVersion):
     id = models.AutoField(primary_key=True)
     hora_creacion = models.TimeField(auto_now_add=True)
     hora_pago = models.TimeField(null=True, blank=True)
@@ -57,19 +74,55 @@ class Pedido(models.Model):
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     mesa = models.ForeignKey(Mesa, on_delete=models.CASCADE)
     cliente = models.ForeignKey(Cliente, on_delete=models.SET_NULL, null=True, blank=True)
+    # Versión de cambio global (core.sync); se asigna en cada guardado
+    version = models.BigIntegerField(default=0, editable=False)
+    version_creacion = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['version'], name='pedido_version_idx'),
+            # Agregados de ventas por rango de fechas (dashboards, rebuild_rollups)
+            models.Index(fields=['fecha_creacion', 'total'], name='pedido_fecha_total_idx'),
+            # Pedidos de un usuario por rango de fechas
+            models.Index(fields=['usuario', 'fecha_creacion'], name='pedido_usuario_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Pedido {self.id} - {self.fecha_creacion}"
 
+    def save(self, *args, **kwargs):
+        # subtotal/total los mantienen las señales de Orden con F() (core.signals):
+        # si no se cambiaron en memoria no se escriben, así una instancia cargada
+        # antes de que cambiaran sus órdenes no pisa los valores de la base
+        from .rollups import decimal
+        if (not self._state.adding and not args and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')
+                and getattr(self, '_totales_original', None) == (decimal(self.subtotal), decimal(self.total))):
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in ('subtotal', 'total')
+            ]
+        super().save(*args, **kwargs)
+
     def calcular_total(self):
-        """Calcula el total del pedido basado en las órdenes asociadas"""
-        ordenes = self.ordenes.all()
-        self.subtotal = sum(orden.menu_item.precio for orden in ordenes)
-        # Aquí podrías implementar alguna lógica para impuestos o descuentos
-        self.total = self.subtotal
-        self.save()
-
-class Orden(models.Model):
+        """
+        Recalcula el total desde las órdenes. Normalmente no hace falta: las
+        señales de Orden lo mantienen al día (ver core.signals); esto lo repara.
+        """
+        with transaction.atomic():
+            # Bloquear el pedido para que dos recálculos simultáneos no se pisen
+            pedido = Pedido.objects.select_for_update().get(id=self.id)
+            # Suma el precio congelado de cada orden en una sola consulta
+            pedido.subtotal = pedido.ordenes.aggregate(subtotal=models.Sum('precio_unitario'))['subtotal'] or 0
+            # Aquí podrías implementar alguna lógica para impuestos o descuentos
+            pedido.total = pedido.subtotal
+            pedido.save()
+        for campo in ('subtotal', 'total', 'version'):
+            setattr(self, campo, getattr(pedido, campo))
+        self._rollup_original = pedido._rollup_original
+        self._totales_original = pedido._totales_original
+
+class Orden(ConVersion):
     id = models.AutoField(primary_key=True)
     hora_creacion = models.TimeField(auto_now_add=True)
     hora_entrega = models.TimeField(null=True, blank=True)
@@ -77,6 +130,105 @@ class Orden(models.Model):
     pedido = models.ForeignKey(Pedido, related_name='ordenes', on_delete=models.CASCADE)
     menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     estado = models.ForeignKey(Estado, on_delete=models.CASCADE)
+    # Precio del ítem al momento de ordenar; se asigna automáticamente (ver core.signals)
+    precio_unitario = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
+    # Versión de cambio global (core.sync); se asigna en cada guardado
+    version = models.BigIntegerField(default=0, editable=False)
+    version_creacion = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['version'], name='orden_version_idx'),
+            # Órdenes por estado en orden de llegada (pantallas de cocina)
+            models.Index(fields=['estado', 'hora_creacion'], name='orden_estado_hora_idx'),
+        ]
+
+    def __str__(self):
+        return f"Orden {self.id} - {self.menu_item.nombre}"
+
+class ResumenVentaHora(models.Model):
+    """Rollup de pedidos por hora, usuario y mesa (mantenido por core.rollups)"""
+    fecha = models.DateField()
+    hora = models.PositiveSmallIntegerField()
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    mesa = models.ForeignKey(Mesa, on_delete=models.CASCADE, related_name='+')
+    cantidad_pedidos = models.IntegerField(default=0)
+    total_ventas = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'hora', 'usuario', 'mesa'], name='resumen_venta_hora_unico'),
+        ]
+
+    def __str__(self):
+        return f"Ventas {self.fecha} {self.hora:02d}h - mesa {self.mesa_id} - usuario {self.usuario_id}"
+
+class ResumenProductoHora(models.Model):
+    """Rollup de órdenes por hora, ítem del menú, usuario y mesa (mantenido por core.rollups)"""
+    fecha = models.DateField()
+    hora = models.PositiveSmallIntegerField()
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='+')
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    mesa = models.ForeignKey(Mesa, on_delete=models.CASCADE, related_name='+')
+    cantidad_ordenes = models.IntegerField(default=0)
+    total_ventas = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'hora', 'menu_item', 'usuario', 'mesa'], name='resumen_producto_hora_unico'),
+        ]
+
+    def __str__(self):
+        return f"Producto {self.menu_item_id} {self.fecha} {self.hora:02d}h"
+
+
+class ContadorCambios(models.Model):
+    """
+    Contadores de versión: id=1 cambios (core.sync), id=2 catálogo (core.catalogo),
+    id=3 roles (core.roles), id=4 horizonte de lápidas podadas (core.sync)
+    """
+    valor = models.BigIntegerField(default=0)
+    # Momento de la última subida; solo lo mantiene core.catalogo (Last-Modified)
+    actualizado = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Versión {self.valor}"
+
+class Eliminacion(models.Model):
+    """Lápida de un Pedido u Orden borrado, para la sincronización incremental"""
+    modelo = models.CharField(max_length=20)
+    objeto_id = models.IntegerField()
+    version = models.BigIntegerField(db_index=True)
+    # Para la retención (core.sync.podar_lapidas)
+    creado = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.modelo} {self.objeto_id} eliminado (v{self.version})"
+
+class EventoSocket(models.Model):
+    """
+    Outbox de eventos de Socket.IO. Se escribe en la misma transacción que el
+    cambio y el despachador de core.outbox lo publica tras el commit.
+    """
+    evento = models.CharField(max_length=40)
+    objeto_id = models.IntegerField()
+    # Eventos en lote (outbox.registrar_lote): todos los ids; objeto_id es el primero
+    objeto_ids = models.JSONField(default=list, blank=True)
+    creado = models.DateTimeField(default=timezone.now)
+    # Próximo momento en que se puede (re)intentar; también sirve de reserva entre procesos
+    disponible = models.DateTimeField(default=timezone.now)
+    reservado_por = models.CharField(max_length=32, blank=True, default='')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    ultimo_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['disponible', 'id'], name='evento_disponible_idx'),
+        ]
+
+    @property
+    def ids(self):
+        return self.objeto_ids or [self.objeto_id]
 
     def __str__(self):
-        return f"Orden {self.id} - {self.menu_item.nombre}"
\ No newline at end of file
+        return f"{self.evento} {self.objeto_id}"
@@ -0,0 +1,205 @@
+"""
+Outbox de eventos de Socket.IO.
+
+Las vistas no emiten directamente: `registrar()` escribe una fila EventoSocket
+en la misma transacción que el cambio, así un evento nunca sale antes del
+commit ni se pierde si el proceso cae después. Los cambios en bloque usan
+`registrar_lote()`: una sola fila con todos los ids. Un despachador asyncio que
+corre dentro del proceso ASGI lee los pendientes por lotes, carga los
+payloads con una consulta por tipo de evento, los emite y borra las filas
+publicadas. Los fallos se reintentan con espera exponencial hasta
+OUTBOX_MAX_INTENTOS. Con varios procesos, cada lote se reserva por
+OUTBOX_RESERVA segundos para que no lo publiquen dos despachadores.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import timedelta
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EventoSocket
+from .registro import campos
+
+logger = logging.getLogger(__name__)
+
+# Límites (en segundos) de los buckets del histograma de latencia commit → emit
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histograma:
+    """Histograma acumulado en memoria del proceso"""
+
+    def __init__(self, limites=BUCKETS_LATENCIA):
+        self.limites = limites
+        self.cuentas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                break
+        else:
+            i = len(self.limites)
+        self.cuentas[i] += 1
+        self.suma += valor
+        self.total += 1
+
+
+metricas = {
+    'publicados': 0,
+    'reintentos': 0,
+    'descartados': 0,
+    'latencia': Histograma(),
+}
+
+_despachador = None
+_tarea = None
+
+
+def registrar(evento, objeto_id):
+    """Encola un evento en la transacción actual; el despachador lo publica tras el commit"""
+    EventoSocket.objects.create(evento=evento, objeto_id=objeto_id)
+    transaction.on_commit(despertar)
+
+
+def registrar_lote(evento, objeto_ids):
+    """Como registrar() para varios objetos, en una sola fila que se publica de una vez"""
+    objeto_ids = list(objeto_ids)
+    EventoSocket.objects.create(evento=evento, objeto_id=objeto_ids[0], objeto_ids=objeto_ids)
+    transaction.on_commit(despertar)
+
+
+def despertar():
+    if _despachador is not None:
+        _despachador.despertar()
+
+
+def cargar_payloads(eventos):
+    """{evento: {objeto_id: payload}} con una consulta por tipo de evento"""
+    from .socketio_server import EVENTOS
+    ids = {}
+    for evento in eventos:
+        ids.setdefault(evento.evento, []).extend(evento.ids)
+    return {nombre: EVENTOS[nombre][0](lista) for nombre, lista in ids.items() if nombre in EVENTOS}
+
+
+class Despachador:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.lote = settings.OUTBOX_LOTE
+        self.intervalo = settings.OUTBOX_INTERVALO
+        self.max_intentos = settings.OUTBOX_MAX_INTENTOS
+        self.espera = settings.OUTBOX_ESPERA_REINTENTO
+        self.reserva = settings.OUTBOX_RESERVA
+        self._loop = None
+        self._aviso = None
+
+    def despertar(self):
+        # Se llama desde on_commit, normalmente en el hilo de una vista síncrona
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._aviso.set)
+
+    async def ejecutar(self):
+        self._loop = asyncio.get_running_loop()
+        self._aviso = asyncio.Event()
+        while True:
+            self._aviso.clear()
+            try:
+                procesados = await self.procesar_lote()
+            except Exception:
+                logger.exception('error_despachador', extra=campos(despachador=self.id))
+                procesados = 0
+            # Con un lote lleno probablemente quedan más: seguir sin esperar
+            if procesados < self.lote:
+                try:
+                    await asyncio.wait_for(self._aviso.wait(), self.intervalo)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def procesar_lote(self):
+        """Publica un lote de eventos pendientes y devuelve cuántos se procesaron"""
+        from .socketio_server import publicar
+        eventos = await database_sync_to_async(self.reservar)()
+        if not eventos:
+            return 0
+        payloads = await database_sync_to_async(cargar_payloads)(eventos)
+
+        publicados = []
+        fallidos = []
+        for evento in eventos:
+            if evento.evento not in payloads:
+                fallidos.append((evento, f"Evento desconocido: {evento.evento}"))
+                continue
+            # Los objetos borrados antes de publicarse no tienen nada que enviar
+            datos = [payloads[evento.evento][objeto_id] for objeto_id in evento.ids
+                     if objeto_id in payloads[evento.evento]]
+            try:
+                # Las filas de un lote salen juntas: la entrega agrupada las junta en un solo evento
+                for data in datos:
+                    await publicar(evento.evento, data)
+            except Exception as e:
+                fallidos.append((evento, str(e)))
+                continue
+            if datos:
+                metricas['latencia'].observar((timezone.now() - evento.creado).total_seconds())
+            publicados.append(evento)
+
+        await database_sync_to_async(self.confirmar)(publicados, fallidos)
+        return len(eventos)
+
+    def reservar(self):
+        ahora = timezone.now()
+        ids = list(
+            EventoSocket.objects.filter(disponible__lte=ahora)
+            .order_by('id').values_list('id', flat=True)[:self.lote]
+        )
+        if not ids:
+            return []
+        EventoSocket.objects.filter(id__in=ids, disponible__lte=ahora).update(
+            disponible=ahora + timedelta(seconds=self.reserva),
+            reservado_por=self.id
+        )
+        return list(EventoSocket.objects.filter(id__in=ids, reservado_por=self.id).order_by('id'))
+
+    def confirmar(self, publicados, fallidos):
+        EventoSocket.objects.filter(id__in=[evento.id for evento in publicados]).delete()
+        metricas['publicados'] += len(publicados)
+
+        ahora = timezone.now()
+        for evento, error in fallidos:
+            intentos = evento.intentos + 1
+            if intentos >= self.max_intentos:
+                logger.error('evento_descartado', extra=campos(
+                    evento=evento.evento, objeto_id=evento.objeto_id, intentos=intentos, error=error
+                ))
+                evento.delete()
+                metricas['descartados'] += 1
+                continue
+            EventoSocket.objects.filter(id=evento.id).update(
+                intentos=intentos,
+                ultimo_error=error,
+                reservado_por='',
+                disponible=ahora + timedelta(seconds=self.espera * 2 ** (intentos - 1))
+            )
+            metricas['reintentos'] += 1
+
+
+def iniciar_despachador():
+    """Arranca el despachador en el loop actual, una sola vez por proceso"""
+    global _despachador, _tarea
+    if _despachador is None and settings.OUTBOX_DESPACHADOR:
+        _despachador = Despachador()
+        _tarea = asyncio.ensure_future(_despachador.ejecutar())
+
+
+def con_despachador(aplicacion):
+    """Envuelve una aplicación ASGI para arrancar el despachador con la primera conexión"""
+    async def app(scope, receive, send):
+        iniciar_despachador()
+        await aplicacion(scope, receive, send)
+    return app
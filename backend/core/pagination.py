@@ -0,0 +1,17 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) sobre el `id` autoincremental.
+
+    Cada página filtra `id > cursor` en lugar de usar OFFSET, así que las
+    páginas profundas cuestan lo mismo que la primera. El tamaño por defecto
+    es API_PAGE_SIZE y el cliente puede pedir otro con
+    `?page_size=`, hasta API_MAX_PAGE_SIZE.
+    """
+    ordering = 'id'
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
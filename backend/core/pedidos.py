@@ -0,0 +1,47 @@
+"""
+Alta de pedidos con sus órdenes en una sola transacción.
+
+Las órdenes se insertan con bulk_create, que no dispara las señales de Orden
+(core.signals): aquí se asignan sus versiones de sincronización, se suman al
+rollup de productos y se invalida la caché de dashboards. El pedido se crea
+ya con su subtotal/total, así que su propio rollup queda correcto vía señales.
+El número de consultas no depende de la cantidad de órdenes.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+
+from . import dashboard, rollups, sync
+from .models import Orden, Pedido
+
+
+def crear_pedido(datos, lineas=None):
+    """
+    Crea un Pedido con `datos` y, si se pasan `lineas` (dicts con menu_item_id,
+    estado_id, anotacion y precio_unitario), sus órdenes.
+    """
+    if lineas is None:
+        return Pedido.objects.create(**datos)
+
+    with transaction.atomic():
+        subtotal = sum((linea['precio_unitario'] for linea in lineas), Decimal(0))
+        # Aquí podrían aplicarse impuestos o descuentos, como en Pedido.calcular_total
+        pedido = Pedido.objects.create(**{**datos, 'subtotal': subtotal, 'total': subtotal})
+        if not lineas:
+            return pedido
+
+        primera = sync.siguiente_version(len(lineas))
+        ordenes = [
+            Orden(pedido=pedido, version=primera + i, version_creacion=primera + i, **linea)
+            for i, linea in enumerate(lineas)
+        ]
+        Orden.objects.bulk_create(ordenes)
+
+        deltas = {}
+        for orden in ordenes:
+            cantidad, total = deltas.get(orden.menu_item_id, (0, Decimal(0)))
+            deltas[orden.menu_item_id] = (cantidad + 1, total + orden.precio_unitario)
+        clave = rollups.clave_pedido(pedido.fecha_creacion, pedido.hora_creacion, pedido.usuario_id, pedido.mesa_id)
+        rollups.sumar_productos(clave, deltas)
+        dashboard.invalidar()
+    return pedido
@@ -0,0 +1,72 @@
+"""
+Clases de permiso de DRF basadas en core.roles: resuelven grupos y permisos
+desde la caché de roles en lugar de consultar la base en cada petición.
+"""
+import hmac
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission, DjangoModelPermissions
+
+from . import roles
+
+
+class PermisosModelo(DjangoModelPermissions):
+    """DjangoModelPermissions con los permisos del usuario tomados de core.roles"""
+
+    def has_permission(self, request, view):
+        if not request.user or (not request.user.is_authenticated and self.authenticated_users_only):
+            return False
+        # Igual que DRF: la vista raíz del router no tiene modelo
+        if getattr(view, '_ignore_model_permissions', False):
+            return True
+        queryset = self._queryset(view)
+        return roles.tiene_permiso(request.user, *self.get_required_permissions(request.method, queryset.model))
+
+
+class EnGrupo(BasePermission):
+    """Permite a los superusuarios y a los miembros de alguno de `grupos`"""
+    grupos = ()
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (user.is_superuser or roles.en_grupo(user, *self.grupos)))
+
+
+class IsAdministrador(EnGrupo):
+    message = "Solo disponible para administradores"
+    grupos = ('Administrador',)
+
+
+class IsGerente(EnGrupo):
+    message = "Solo disponible para gerentes y administradores"
+    grupos = ('Administrador', 'Gerente')
+
+
+class IsCocinero(EnGrupo):
+    message = "Solo disponible para cocineros"
+    grupos = ('Cocinero',)
+
+
+class IsMesero(EnGrupo):
+    message = "Solo disponible para meseros"
+    grupos = ('Mesero',)
+
+
+class PuedeCambiarOrdenes(BasePermission):
+    """Cocineros o quien tenga core.change_orden"""
+    message = "No tienes permiso para cambiar estados"
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (
+            roles.en_grupo(user, 'Cocinero') or roles.tiene_permiso(user, 'core.change_orden')
+        ))
+
+
+class TokenMetricas(BasePermission):
+    """Scrapers de Prometheus con METRICAS_TOKEN en la cabecera X-Metricas-Token"""
+
+    def has_permission(self, request, view):
+        esperado = settings.METRICAS_TOKEN
+        recibido = request.headers.get('X-Metricas-Token', '')
+        return bool(esperado) and hmac.compare_digest(recibido.encode(), esperado.encode())
@@ -0,0 +1,122 @@
+"""
+Registro (logging) estructurado y sin bloqueos.
+
+Los registros se encolan con ManejadorCola (un QueueHandler) y un
+QueueListener los formatea y escribe en stderr desde su propio hilo: ni el
+loop de Socket.IO ni las vistas esperan a stdout/stderr. FormatoClaveValor
+produce una línea `clave=valor` por registro; los campos estructurados se
+pasan con `extra=campos(...)`:
+
+    logger.info('conectado', extra=campos(usuario=3, sid=sid))
+    -> ts=... nivel=INFO logger=core.socketio_server evento=conectado usuario=3 sid=...
+
+Los niveles por logger y el muestreo de los logs de paquetes de
+engine.io/socket.io se configuran en settings (REGISTRO_NIVELES y
+REGISTRO_MUESTREO, ver LOGGING).
+"""
+import atexit
+import logging
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+
+def campos(**valores):
+    """Campos estructurados para el `extra` de una llamada de logging"""
+    return {'campos': valores}
+
+
+def _valor(valor):
+    texto = str(valor)
+    if not texto or any(c in texto for c in ' ="\n'):
+        return '"' + texto.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+    return texto
+
+
+class FormatoClaveValor(logging.Formatter):
+    def format(self, record):
+        pares = [
+            ('ts', self.formatTime(record, '%Y-%m-%dT%H:%M:%S')),
+            ('nivel', record.levelname),
+            ('logger', record.name),
+            ('evento', record.getMessage()),
+        ]
+        pares.extend(getattr(record, 'campos', {}).items())
+        if record.exc_info:
+            pares.append(('error', self.formatException(record.exc_info)))
+        return ' '.join(f'{clave}={_valor(valor)}' for clave, valor in pares)
+
+
+class Muestreo(logging.Filter):
+    """
+    Deja pasar uno de cada N registros DEBUG/INFO de los loggers listados en
+    `cada` ({nombre: N}, también cubre sus hijos). WARNING o más siempre pasa.
+    """
+
+    def __init__(self, cada=None):
+        super().__init__()
+        self.cada = dict(cada or {})
+        self._cuentas = {}
+        self._lock = threading.Lock()
+
+    def _tasa(self, nombre):
+        while nombre:
+            if nombre in self.cada:
+                return nombre, self.cada[nombre]
+            nombre = nombre.rpartition('.')[0]
+        return None, 1
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        nombre, n = self._tasa(record.name)
+        if n <= 1:
+            return True
+        with self._lock:
+            cuenta = self._cuentas.get(nombre, 0)
+            self._cuentas[nombre] = cuenta + 1
+        return cuenta % n == 0
+
+
+class ManejadorCola(QueueHandler):
+    """
+    QueueHandler con su propio QueueListener hacia stderr. El registro se
+    encola sin formatear: el formato y la escritura ocurren en el hilo del
+    listener. Con la cola llena (`maximo`) los registros se descartan y se
+    cuentan en `descartados` en lugar de bloquear.
+    """
+
+    def __init__(self, maximo=10000, destino=None):
+        super().__init__(queue.Queue(maximo))
+        self.descartados = 0
+        salida = logging.StreamHandler(destino or sys.stderr)
+        salida.setFormatter(FormatoClaveValor())
+        self.listener = QueueListener(self.queue, salida, respect_handler_level=False)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def prepare(self, record):
+        # Sin formatear: la cola es del mismo proceso, no hace falta serializar
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super().close()
+
+
+def niveles_desde_entorno(valor, base):
+    """'core=DEBUG,engineio.server=INFO' sobre los niveles por defecto"""
+    niveles = dict(base)
+    for par in filter(None, (parte.strip() for parte in (valor or '').split(','))):
+        nombre, _, nivel = par.partition('=')
+        niveles[nombre.strip()] = nivel.strip().upper()
+    return niveles
@@ -0,0 +1,127 @@
+"""
+Roles y permisos de cada usuario con caché por proceso.
+
+Los grupos y el conjunto de permisos (`get_all_permissions()`) de un usuario
+se resuelven una vez y se guardan en memoria; las comprobaciones de permisos
+de las vistas (core.permissions) ya no consultan la base. is_superuser e
+is_active se leen del propio usuario, que la autenticación carga igual.
+
+Las señales de core.signals llaman a `invalidar()` en cada m2m_changed de
+User.groups, User.user_permissions y Group.permissions, al guardar o borrar
+un Group y al crear o borrar un User: se vacía la caché local y se sube un
+contador compartido (ContadorCambios id=3) que los demás procesos comparan
+como mucho cada ROLES_REVISION segundos. Las escrituras que no pasan por señales deben llamar
+a `invalidar()` a mano.
+
+Como en core.catalogo, cada entrada guarda la versión leída antes de cargarla
+y solo se usa mientras esa siga vigente: una carga que se cruza con una
+invalidación no deja roles viejos en la caché. Se conservan como mucho
+ROLES_MAXIMO usuarios; al pasarse se descartan los usados hace más tiempo.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+
+from .models import ContadorCambios
+
+# Fila de ContadorCambios con la versión de roles (1 es core.sync, 2 core.catalogo)
+ID_CONTADOR = 3
+
+
+class Roles:
+    __slots__ = ('grupos', 'permisos')
+
+    def __init__(self, grupos, permisos):
+        self.grupos = grupos       # frozenset de nombres de grupo
+        self.permisos = permisos   # frozenset de 'app_label.codename'
+
+
+SIN_ROLES = Roles(frozenset(), frozenset())
+
+_roles = OrderedDict()   # user_id -> (versión, Roles), del menos al más usado
+_version = None
+_revisado = 0.0
+_lock = threading.Lock()
+
+
+def _version_compartida():
+    return ContadorCambios.objects.filter(id=ID_CONTADOR).values_list('valor', flat=True).first() or 0
+
+
+def _revisar():
+    """Versión vigente; vacía la caché si otro proceso la subió desde la última revisión"""
+    global _version, _revisado
+    ahora = time.monotonic()
+    version = _version
+    if version is not None and ahora - _revisado < settings.ROLES_REVISION:
+        return version
+    version = _version_compartida()
+    with _lock:
+        if version != _version:
+            _roles.clear()
+            _version = version
+        _revisado = ahora
+    return version
+
+
+def _descartar():
+    global _version
+    with _lock:
+        _roles.clear()
+        _version = None
+
+
+def invalidar():
+    """Vacía la caché de este proceso y avisa a los demás subiendo la versión compartida"""
+    if not ContadorCambios.objects.filter(id=ID_CONTADOR).update(valor=F('valor') + 1):
+        ContadorCambios.objects.get_or_create(id=ID_CONTADOR, defaults={'valor': 1})
+    _descartar()
+    # Otro hilo pudo resolver roles antes del commit con los datos viejos
+    transaction.on_commit(_descartar)
+
+
+def de_usuario(user):
+    if not user or not user.is_authenticated:
+        return SIN_ROLES
+    # Leer la versión antes que las filas, como core.catalogo
+    version = _revisar()
+    with _lock:
+        entrada = _roles.get(user.id)
+        if entrada is not None and entrada[0] == version:
+            _roles.move_to_end(user.id)
+            return entrada[1]
+
+    # Un usuario construido desde el token (core.autenticacion) no tiene relaciones
+    usuario = user if isinstance(user, User) else User.objects.filter(id=user.id).first()
+    if usuario is None:
+        return SIN_ROLES
+    roles = Roles(
+        frozenset(usuario.groups.values_list('name', flat=True)),
+        frozenset(usuario.get_all_permissions()),
+    )
+    with _lock:
+        # Si hubo una invalidación durante la carga, estos roles pueden ser viejos: no se guardan
+        if version == _version:
+            _roles[user.id] = (version, roles)
+            _roles.move_to_end(user.id)
+            while len(_roles) > settings.ROLES_MAXIMO:
+                _roles.popitem(last=False)
+    return roles
+
+
+def en_grupo(user, *nombres):
+    return not de_usuario(user).grupos.isdisjoint(nombres)
+
+
+def tiene_permiso(user, *permisos):
+    """Equivalente a user.has_perms(permisos) sin consultar la base"""
+    if not user or not user.is_active:
+        return False
+    if user.is_superuser:
+        return True
+    return de_usuario(user).permisos.issuperset(permisos)
@@ -0,0 +1,169 @@
+"""
+Mantenimiento incremental de los rollups de ventas por hora.
+
+Los dashboards leen de ResumenVentaHora (hora × usuario × mesa) y de
+ResumenProductoHora (hora × ítem del menú × usuario × mesa) en lugar de
+recorrer Pedido/Orden. Las señales de core.signals aplican aquí los deltas
+de cada alta, cambio o baja; el comando rebuild_rollups reconstruye un
+rango completo a partir de los datos originales.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractHour
+
+from .models import Orden, Pedido, ResumenProductoHora, ResumenVentaHora
+
+
+def decimal(valor):
+    """Normaliza importes que pueden llegar como str/float/None antes de guardarse"""
+    return Decimal(0) if valor is None else Decimal(str(valor))
+
+
+def clave_pedido(fecha, hora_creacion, usuario_id, mesa_id):
+    """Clave del bucket de un pedido, o None si aún no tiene fecha/hora"""
+    if fecha is None or hora_creacion is None:
+        return None
+    return {
+        'fecha': fecha,
+        'hora': hora_creacion.hour,
+        'usuario_id': usuario_id,
+        'mesa_id': mesa_id,
+    }
+
+
+def aplicar_delta(modelo, clave, **deltas):
+    """
+    Suma `deltas` a la fila del rollup identificada por `clave`, creándola si no
+    existe. Los descuentos solo actualizan: si la fila no está (por ejemplo, la
+    borró la cascada de su mesa, usuario o ítem) no hay nada que descontar.
+    """
+    if clave is None or not any(deltas.values()):
+        return
+    actualizacion = {campo: F(campo) + valor for campo, valor in deltas.items()}
+    if modelo.objects.filter(**clave).update(**actualizacion):
+        return
+    if any(valor < 0 for valor in deltas.values()):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**clave, **deltas)
+    except IntegrityError:
+        # Otra petición creó la fila entre el update y el create
+        modelo.objects.filter(**clave).update(**actualizacion)
+
+
+def sumar_productos(clave, deltas):
+    """
+    Aplica en bloque los deltas de varios ítems del menú dentro del bucket `clave`.
+    `deltas` es {menu_item_id: (cantidad_ordenes, total_ventas)}.
+    """
+    if clave is None or not deltas:
+        return
+    existentes = list(ResumenProductoHora.objects.filter(**clave, menu_item_id__in=deltas))
+    for fila in existentes:
+        cantidad, total = deltas[fila.menu_item_id]
+        fila.cantidad_ordenes = F('cantidad_ordenes') + cantidad
+        fila.total_ventas = F('total_ventas') + total
+    ResumenProductoHora.objects.bulk_update(existentes, ['cantidad_ordenes', 'total_ventas'])
+
+    encontrados = {fila.menu_item_id for fila in existentes}
+    nuevas = {menu_item_id: delta for menu_item_id, delta in deltas.items() if menu_item_id not in encontrados}
+    try:
+        with transaction.atomic():
+            ResumenProductoHora.objects.bulk_create([
+                ResumenProductoHora(**clave, menu_item_id=menu_item_id, cantidad_ordenes=cantidad, total_ventas=total)
+                for menu_item_id, (cantidad, total) in nuevas.items()
+            ])
+    except IntegrityError:
+        # Otra petición creó alguna de las filas: aplicar uno por uno
+        for menu_item_id, (cantidad, total) in nuevas.items():
+            aplicar_delta(ResumenProductoHora, {**clave, 'menu_item_id': menu_item_id},
+                          cantidad_ordenes=cantidad, total_ventas=total)
+
+
+def mover_productos(clave_anterior, clave_nueva, pedido_id):
+    """Mueve las órdenes de un pedido al bucket nuevo cuando cambia su fecha, hora, usuario o mesa"""
+    filas = Orden.objects.filter(pedido_id=pedido_id).values('menu_item_id').annotate(
+        cantidad=Count('id'),
+        total=Sum('precio_unitario')
+    )
+    for fila in filas:
+        menu_item = {'menu_item_id': fila['menu_item_id']}
+        if clave_anterior is not None:
+            aplicar_delta(ResumenProductoHora, {**clave_anterior, **menu_item},
+                          cantidad_ordenes=-fila['cantidad'], total_ventas=-(fila['total'] or 0))
+        if clave_nueva is not None:
+            aplicar_delta(ResumenProductoHora, {**clave_nueva, **menu_item},
+                          cantidad_ordenes=fila['cantidad'], total_ventas=fila['total'] or 0)
+
+
+def recalcular_ventas(claves):
+    """Recalcula desde Pedido las filas de ResumenVentaHora de los buckets dados"""
+    for clave in claves:
+        fila = Pedido.objects.filter(
+            fecha_creacion=clave['fecha'], hora_creacion__hour=clave['hora'],
+            usuario_id=clave['usuario_id'], mesa_id=clave['mesa_id']
+        ).aggregate(cantidad=Count('id'), total=Sum('total'))
+        ResumenVentaHora.objects.update_or_create(
+            **clave, defaults={'cantidad_pedidos': fila['cantidad'], 'total_ventas': fila['total'] or 0}
+        )
+
+
+def reconstruir(desde=None, hasta=None, modelos=None):
+    """
+    Borra y recalcula los rollups para el rango de fechas dado (ambos inclusive).
+    Sin rango, reconstruye todo. Devuelve (filas_ventas, filas_productos).
+    `modelos` permite pasar los modelos históricos de una migración como
+    (Pedido, Orden, ResumenVentaHora, ResumenProductoHora).
+    """
+    ModeloPedido, ModeloOrden, ModeloVentas, ModeloProductos = modelos or (
+        Pedido, Orden, ResumenVentaHora, ResumenProductoHora
+    )
+    filtro_rollup = {}
+    filtro_pedido = {}
+    if desde is not None:
+        filtro_rollup['fecha__gte'] = desde
+        filtro_pedido['fecha_creacion__gte'] = desde
+    if hasta is not None:
+        filtro_rollup['fecha__lte'] = hasta
+        filtro_pedido['fecha_creacion__lte'] = hasta
+    filtro_orden = {f'pedido__{campo}': valor for campo, valor in filtro_pedido.items()}
+
+    with transaction.atomic():
+        ModeloVentas.objects.filter(**filtro_rollup).delete()
+        ModeloProductos.objects.filter(**filtro_rollup).delete()
+
+        ventas = [
+            ModeloVentas(
+                fecha=fila['fecha_creacion'],
+                hora=fila['hora'],
+                usuario_id=fila['usuario_id'],
+                mesa_id=fila['mesa_id'],
+                cantidad_pedidos=fila['cantidad'],
+                total_ventas=fila['total'] or 0,
+            )
+            for fila in ModeloPedido.objects.filter(**filtro_pedido).values(
+                'fecha_creacion', 'usuario_id', 'mesa_id', hora=ExtractHour('hora_creacion')
+            ).annotate(cantidad=Count('id'), total=Sum('total')).order_by()
+        ]
+        productos = [
+            ModeloProductos(
+                fecha=fila['pedido__fecha_creacion'],
+                hora=fila['hora'],
+                menu_item_id=fila['menu_item_id'],
+                usuario_id=fila['pedido__usuario_id'],
+                mesa_id=fila['pedido__mesa_id'],
+                cantidad_ordenes=fila['cantidad'],
+                total_ventas=fila['total'] or 0,
+            )
+            for fila in ModeloOrden.objects.filter(**filtro_orden).values(
+                'pedido__fecha_creacion', 'menu_item_id', 'pedido__usuario_id', 'pedido__mesa_id',
+                hora=ExtractHour('pedido__hora_creacion')
+            ).annotate(cantidad=Count('id'), total=Sum('precio_unitario')).order_by()
+        ]
+        ModeloVentas.objects.bulk_create(ventas, batch_size=500)
+        ModeloProductos.objects.bulk_create(productos, batch_size=500)
+
+    return len(ventas), len(productos)
@@ -1,13 +1,38 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User, Group
 from .models import Componente, MenuItem, Estado, Mesa, Cliente, Pedido, Orden
+from . import catalogo
+from .metricas import medir_serializacion
 
-class GroupSerializer(serializers.ModelSerializer):
+class ListaMedida(serializers.ListSerializer):
+    @property
+    def data(self):
+        with medir_serializacion():
+            return super().data
+
+class ModeloSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer cuyo `.data` (también con many=True) se suma al tiempo de
+    serialización de la petición (ver core.metricas)
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        meta = getattr(cls, 'Meta', None)
+        if meta is not None and not hasattr(meta, 'list_serializer_class'):
+            meta.list_serializer_class = ListaMedida
+
+    @property
+    def data(self):
+        with medir_serializacion():
+            return super().data
+
+class GroupSerializer(ModeloSerializer):
     class Meta:
         model = Group
         fields = ['id', 'name']
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ModeloSerializer):
     grupos = serializers.SerializerMethodField()
     password = serializers.CharField(write_only=True, required=False)
     groups = serializers.PrimaryKeyRelatedField(
@@ -62,12 +87,12 @@ class UserSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
-class ComponenteSerializer(serializers.ModelSerializer):
+class ComponenteSerializer(ModeloSerializer):
     class Meta:
         model = Componente
         fields = '__all__'
 
-class MenuItemSerializer(serializers.ModelSerializer):
+class MenuItemSerializer(ModeloSerializer):
     # Add a string representation
     nombre_completo = serializers.SerializerMethodField()
     
@@ -78,7 +103,7 @@ class MenuItemSerializer(serializers.ModelSerializer):
     def get_nombre_completo(self, obj):
         return f"{obj.nombre} - ${obj.precio}"
 
-class MenuItemDetailSerializer(serializers.ModelSerializer):
+class MenuItemDetailSerializer(ModeloSerializer):
     componentes = ComponenteSerializer(many=True, read_only=True)
     nombre_completo = serializers.SerializerMethodField()
     
@@ -89,27 +114,27 @@ class MenuItemDetailSerializer(serializers.ModelSerializer):
     def get_nombre_completo(self, obj):
         return f"{obj.nombre} - ${obj.precio}"
 
-class EstadoSerializer(serializers.ModelSerializer):
+class EstadoSerializer(ModeloSerializer):
     class Meta:
         model = Estado
         fields = '__all__'
 
-class MesaSerializer(serializers.ModelSerializer):
+class MesaSerializer(ModeloSerializer):
     class Meta:
         model = Mesa
         fields = '__all__'
 
-class ClienteSerializer(serializers.ModelSerializer):
+class ClienteSerializer(ModeloSerializer):
     class Meta:
         model = Cliente
         fields = '__all__'
 
-class OrdenSerializer(serializers.ModelSerializer):
+class OrdenSerializer(ModeloSerializer):
     class Meta:
         model = Orden
         fields = '__all__'
 
-class OrdenDetailSerializer(serializers.ModelSerializer):
+class OrdenDetailSerializer(ModeloSerializer):
     menu_item = MenuItemDetailSerializer(read_only=True)
     estado = EstadoSerializer(read_only=True)
     
@@ -117,12 +142,12 @@ class OrdenDetailSerializer(serializers.ModelSerializer):
         model = Orden
         fields = '__all__'
 
-class PedidoSerializer(serializers.ModelSerializer):
+class PedidoSerializer(ModeloSerializer):
     class Meta:
         model = Pedido
         fields = '__all__'
 
-class PedidoDetailSerializer(serializers.ModelSerializer):
+class PedidoDetailSerializer(ModeloSerializer):
     ordenes = OrdenSerializer(many=True, read_only=True)
     mesa = MesaSerializer(read_only=True)
     cliente = ClienteSerializer(read_only=True)
@@ -130,4 +155,41 @@ class PedidoDetailSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Pedido
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+class OrdenLineaSerializer(ModeloSerializer):
+    """Línea de un pedido creado con sus órdenes (ver PedidoCreateSerializer)"""
+    # Ids simples: se validan todos juntos en PedidoCreateSerializer.validate_ordenes
+    menu_item = serializers.IntegerField(source='menu_item_id')
+    estado = serializers.IntegerField(source='estado_id')
+
+    class Meta:
+        model = Orden
+        fields = ['id', 'menu_item', 'estado', 'anotacion', 'precio_unitario', 'hora_creacion']
+        read_only_fields = ['precio_unitario', 'hora_creacion']
+
+class PedidoCreateSerializer(PedidoSerializer):
+    """
+    Alta de un pedido con sus órdenes en una sola petición. Las órdenes se
+    insertan en bloque y el subtotal/total se calculan a partir de ellas.
+    """
+    ordenes = OrdenLineaSerializer(many=True, required=False)
+
+    def validate_ordenes(self, lineas):
+        errores = []
+        for linea in lineas:
+            # Ítems y estados se validan contra el catálogo en memoria (core.catalogo)
+            menu_item = catalogo.menu_item(linea['menu_item_id'])
+            if menu_item is None:
+                errores.append(f"Ítem del menú {linea['menu_item_id']} no existe")
+            else:
+                linea['precio_unitario'] = menu_item.precio
+            if catalogo.estado(linea['estado_id']) is None:
+                errores.append(f"Estado {linea['estado_id']} no existe")
+        if errores:
+            raise serializers.ValidationError(errores)
+        return lineas
+
+    def create(self, validated_data):
+        from .pedidos import crear_pedido
+        return crear_pedido(validated_data, validated_data.pop('ordenes', None))
@@ -0,0 +1,250 @@
+from django.contrib.auth.models import Group, User
+from django.db.models import F, QuerySet, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import catalogo, dashboard, roles, sync
+from .models import Componente, Estado, MenuItem, Mesa, Orden, Pedido, ResumenProductoHora, ResumenVentaHora
+from .rollups import aplicar_delta, clave_pedido, decimal, mover_productos
+
+
+# ---------------------------------------------------------------------------
+# Rollups de ventas: guardamos el estado original de cada instancia al
+# cargarla para poder aplicar solo la diferencia al guardar o borrar.
+# ---------------------------------------------------------------------------
+
+def _estado_pedido(pedido):
+    return (pedido.fecha_creacion, pedido.hora_creacion, pedido.usuario_id, pedido.mesa_id, decimal(pedido.total))
+
+def _clave_de_pedido(pedido_id):
+    pedido = Pedido.objects.filter(id=pedido_id).values(
+        'fecha_creacion', 'hora_creacion', 'usuario_id', 'mesa_id'
+    ).first()
+    if pedido is None:
+        return None
+    return clave_pedido(pedido['fecha_creacion'], pedido['hora_creacion'], pedido['usuario_id'], pedido['mesa_id'])
+
+def _clave_orden(pedido_id, menu_item_id):
+    clave = _clave_de_pedido(pedido_id)
+    if clave is None:
+        return None
+    return {**clave, 'menu_item_id': menu_item_id}
+
+def _precio(orden):
+    return decimal(orden.precio_unitario)
+
+def _en_cascada_de(origin, *modelos):
+    """
+    La baja viene del borrado de una instancia o queryset de `modelos`: sus
+    filas de rollup caen en la misma cascada y no hay que descontarles nada
+    """
+    modelo = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(modelo, modelos)
+
+@receiver(post_init, sender=Pedido)
+def recordar_pedido(sender, instance, **kwargs):
+    instance._rollup_original = _estado_pedido(instance)
+    instance._totales_original = _totales(instance)
+
+@receiver(post_save, sender=Pedido)
+def actualizar_rollup_pedido(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    fecha, hora, usuario_id, mesa_id, total = _estado_pedido(instance)
+    clave_nueva = clave_pedido(fecha, hora, usuario_id, mesa_id)
+
+    if created:
+        aplicar_delta(ResumenVentaHora, clave_nueva, cantidad_pedidos=1, total_ventas=total)
+    else:
+        fecha_ant, hora_ant, usuario_ant, mesa_ant, total_ant = instance._rollup_original
+        clave_anterior = clave_pedido(fecha_ant, hora_ant, usuario_ant, mesa_ant)
+        if clave_anterior == clave_nueva:
+            aplicar_delta(ResumenVentaHora, clave_nueva, total_ventas=total - total_ant)
+        else:
+            if _totales(instance) == instance._totales_original:
+                # Pedido.save no escribió los totales: el que se mueve de bucket es el de la base
+                total = total_ant = decimal(Pedido.objects.values_list('total', flat=True).get(id=instance.id))
+            aplicar_delta(ResumenVentaHora, clave_anterior, cantidad_pedidos=-1, total_ventas=-total_ant)
+            aplicar_delta(ResumenVentaHora, clave_nueva, cantidad_pedidos=1, total_ventas=total)
+            mover_productos(clave_anterior, clave_nueva, instance.id)
+
+    instance._rollup_original = _estado_pedido(instance)
+    instance._totales_original = _totales(instance)
+
+@receiver(post_delete, sender=Pedido)
+def eliminar_rollup_pedido(sender, instance, origin=None, **kwargs):
+    if _en_cascada_de(origin, Mesa, User):
+        return
+    fecha, hora, usuario_id, mesa_id, total = instance._rollup_original
+    aplicar_delta(ResumenVentaHora, clave_pedido(fecha, hora, usuario_id, mesa_id),
+                  cantidad_pedidos=-1, total_ventas=-total)
+
+@receiver(post_init, sender=Orden)
+def recordar_orden(sender, instance, **kwargs):
+    instance._rollup_original = (instance.pedido_id, instance.menu_item_id, _precio(instance))
+
+@receiver(pre_save, sender=Orden)
+def congelar_precio_orden(sender, instance, raw=False, **kwargs):
+    """Guarda el precio del ítem al crear la orden o al cambiarla de ítem"""
+    if raw:
+        return
+    if instance.precio_unitario is None or instance.menu_item_id != instance._rollup_original[1]:
+        item = catalogo.menu_item(instance.menu_item_id)
+        instance.precio_unitario = item.precio if item is not None else instance.menu_item.precio
+
+@receiver(post_save, sender=Orden)
+def actualizar_rollup_orden(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    pedido_ant, menu_item_ant, precio_ant = instance._rollup_original
+    actual = (instance.pedido_id, instance.menu_item_id, _precio(instance))
+    if not created and instance._rollup_original == actual:
+        return
+
+    if not created:
+        aplicar_delta(ResumenProductoHora, _clave_orden(pedido_ant, menu_item_ant),
+                      cantidad_ordenes=-1, total_ventas=-precio_ant)
+    aplicar_delta(ResumenProductoHora, _clave_orden(instance.pedido_id, instance.menu_item_id),
+                  cantidad_ordenes=1, total_ventas=_precio(instance))
+
+    # Totales del pedido: solo cambian si la orden cambió de pedido o de precio
+    if created:
+        ajustar_total_pedido(instance.pedido_id, _precio(instance))
+    elif pedido_ant != instance.pedido_id:
+        ajustar_total_pedido(pedido_ant, -precio_ant)
+        ajustar_total_pedido(instance.pedido_id, _precio(instance))
+    else:
+        ajustar_total_pedido(instance.pedido_id, _precio(instance) - precio_ant)
+    instance._rollup_original = actual
+
+@receiver(post_delete, sender=Orden)
+def eliminar_rollup_orden(sender, instance, origin=None, **kwargs):
+    # Con la mesa o el usuario se va también el pedido, con sus totales y rollups
+    if _en_cascada_de(origin, Mesa, User):
+        return
+    pedido_id, menu_item_id, precio = instance._rollup_original
+    if not _en_cascada_de(origin, MenuItem):
+        aplicar_delta(ResumenProductoHora, _clave_orden(pedido_id, menu_item_id),
+                      cantidad_ordenes=-1, total_ventas=-precio)
+    ajustar_total_pedido(pedido_id, -precio)
+
+# ---------------------------------------------------------------------------
+# Totales de pedido: subtotal/total se mantienen en la base con F() cada vez
+# que una orden se agrega, se quita o cambia de precio, sin cargar el pedido.
+# Pedido.save no reescribe los totales si no cambiaron en memoria.
+# ---------------------------------------------------------------------------
+
+def _totales(pedido):
+    return (decimal(pedido.subtotal), decimal(pedido.total))
+
+def ajustar_total_pedido(pedido_id, delta):
+    """
+    Suma `delta` al subtotal y total del pedido, a su rollup de ventas y a su
+    versión. Si el pedido ya no existe el UPDATE no toca nada y el rollup
+    tampoco se ajusta.
+    """
+    if pedido_id is None or not delta:
+        return
+    actualizados = Pedido.objects.filter(id=pedido_id).update(
+        subtotal=F('subtotal') + delta,
+        total=F('total') + delta,
+        version=sync.siguiente_version()
+    )
+    if actualizados:
+        aplicar_delta(ResumenVentaHora, _clave_de_pedido(pedido_id), total_ventas=delta)
+
+@receiver(pre_delete, sender=Pedido)
+def total_restante_al_borrar(sender, instance, **kwargs):
+    """
+    El borrado en cascada elimina primero las órdenes, y cada una descuenta su
+    precio del pedido y del rollup mientras el pedido existe. Al pedido le
+    queda por descontar el total vigente en la base menos esas órdenes.
+    """
+    restante = Pedido.objects.filter(id=instance.id).annotate(
+        restante=F('total') - Coalesce(Sum('ordenes__precio_unitario'), 0, output_field=Pedido.total.field)
+    ).values_list('restante', flat=True).first()
+    if restante is not None:
+        instance._rollup_original = instance._rollup_original[:4] + (decimal(restante),)
+
+# ---------------------------------------------------------------------------
+# Caché de dashboards: cualquier escritura de Pedido u Orden invalida los
+# resultados calculados.
+# ---------------------------------------------------------------------------
+
+@receiver(post_save, sender=Pedido)
+@receiver(post_delete, sender=Pedido)
+@receiver(post_save, sender=Orden)
+@receiver(post_delete, sender=Orden)
+def invalidar_dashboards(sender, **kwargs):
+    dashboard.invalidar()
+
+
+# ---------------------------------------------------------------------------
+# Sincronización incremental: cada escritura toma una versión nueva y cada
+# borrado deja una lápida.
+# ---------------------------------------------------------------------------
+
+@receiver(pre_save, sender=Pedido)
+@receiver(pre_save, sender=Orden)
+def asignar_version(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance.version = sync.siguiente_version()
+    if instance._state.adding:
+        instance.version_creacion = instance.version
+
+@receiver(post_delete, sender=Pedido)
+def registrar_eliminacion_pedido(sender, instance, **kwargs):
+    sync.registrar_eliminacion('pedidos', instance.id)
+
+@receiver(post_delete, sender=Orden)
+def registrar_eliminacion_orden(sender, instance, **kwargs):
+    sync.registrar_eliminacion('ordenes', instance.id)
+
+
+# ---------------------------------------------------------------------------
+# Catálogo en memoria (core.catalogo): cualquier escritura de sus modelos
+# descarta la copia local y avisa a los demás procesos. Los grupos no se
+# cachean pero comparten la versión para la caché HTTP de sus endpoints.
+# ---------------------------------------------------------------------------
+
+@receiver(post_save, sender=Estado)
+@receiver(post_delete, sender=Estado)
+@receiver(post_save, sender=Mesa)
+@receiver(post_delete, sender=Mesa)
+@receiver(post_save, sender=Componente)
+@receiver(post_delete, sender=Componente)
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(m2m_changed, sender=MenuItem.componentes.through)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidar_catalogo(sender, action=None, **kwargs):
+    # También con raw (loaddata): los datos cargados deben verse igual
+    if action is not None and not action.startswith('post_'):
+        return
+    catalogo.invalidar()
+
+
+# ---------------------------------------------------------------------------
+# Caché de roles (core.roles): membresías, permisos, grupos y usuarios
+# ---------------------------------------------------------------------------
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidar_roles(sender, action=None, **kwargs):
+    if action is not None and not action.startswith('post_'):
+        return
+    roles.invalidar()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidar_roles_usuario(sender, instance, created=True, **kwargs):
+    # Solo altas y bajas: un id nuevo o reutilizado no debe heredar roles en caché
+    if created:
+        roles.invalidar()
@@ -1,5 +1,6 @@
 import socketio
 import asyncio
+import logging
 import os
 import django
 from channels.db import database_sync_to_async
@@ -9,42 +10,67 @@ if not os.environ.get('DJANGO_SETTINGS_MODULE'):
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
     django.setup()
 
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from django.conf import settings
 
-# Crear el servidor Socket.IO
+from core.agrupacion import AGRUPABLES, CAPACIDAD, AgrupadorEventos, sala_lote
+from core import handshake, metricas
+from core.registro import campos
+from core.socketio_managers import crear_manager
+
+logger = logging.getLogger(__name__)
+
+# Crear el servidor Socket.IO; el client manager decide si los emits cruzan procesos.
+# Se le pasan los loggers (no True) para que no agregue su propio StreamHandler
+# síncrono: niveles y muestreo salen de LOGGING (core.registro)
 sio = socketio.AsyncServer(
     async_mode='asgi',
+    client_manager=crear_manager(settings.SOCKETIO_MANAGER),
     cors_allowed_origins='*',
-    logger=True,
-    engineio_logger=True
+    logger=logging.getLogger('socketio.server'),
+    engineio_logger=logging.getLogger('engineio.server')
 )
 
+# Sesiones por sala para /core/metrics/ y el evento 'metricas'
+metricas.registrar_socket(sio.manager)
+
 # Crear la aplicación ASGI
 socket_app = socketio.ASGIApp(sio)
 
-# Función asíncrona para validar el token
-@database_sync_to_async
-def validate_token(token):
-    try:
-        jwt_auth = JWTAuthentication()
-        validated_token = jwt_auth.get_validated_token(token)
-        user = jwt_auth.get_user(validated_token)
-        
-        if not user or not user.is_active:
-            return None
-        
-        return {
-            'user_id': str(user.id),
-            'username': user.username
-        }
-    except (InvalidToken, TokenError) as e:
-        print(f"Error validando token: {e}")
-        return None
-    except Exception as e:
-        print(f"Excepción inesperada: {e}")
-        return None
+# Entrega agrupada para los clientes que la piden (core.agrupacion); 0 la desactiva
+agrupador = AgrupadorEventos(sio, settings.SOCKETIO_AGRUPACION_MS / 1000)
+
+# Salas por rol: cada grupo de Django se asocia a la sala de su área
+SALAS_POR_GRUPO = {
+    'Cocinero': 'cocina',
+    'Mesero': 'salon',
+    'Administrador': 'gerencia',
+    'Gerente': 'gerencia',
+}
+
+def sala_usuario(user_id):
+    return f'usuario:{user_id}'
+
+def sala_mesa(mesa_id):
+    return f'mesa:{mesa_id}'
+
+def sala_pedido(pedido_id):
+    return f'pedido:{pedido_id}'
+
+def salas_de_sesion(user_data):
+    """Salas a las que se une una sesión al conectarse"""
+    salas = {SALAS_POR_GRUPO[grupo] for grupo in user_data['grupos'] if grupo in SALAS_POR_GRUPO}
+    if user_data['is_superuser']:
+        salas.add('gerencia')
+    salas.add(sala_usuario(user_data['user_id']))
+    return sorted(salas)
+
+def agrupa_eventos(auth):
+    """El cliente declaró en el handshake que entiende los eventos agrupados"""
+    return bool(settings.SOCKETIO_AGRUPACION_MS) and CAPACIDAD in (auth.get('capacidades') or [])
+
+def salas_de_evento(pedido_id, mesa_id, usuario_id):
+    """Destinatarios de un evento de pedido/orden: cocina, gerencia, el dueño y los suscriptores"""
+    return ['cocina', 'gerencia', sala_usuario(usuario_id), sala_mesa(mesa_id), sala_pedido(pedido_id)]
 
 # Middleware de autenticación
 @sio.event
@@ -52,80 +78,225 @@ async def connect(sid, environ, auth):
     try:
         # Verificar el token JWT enviado por el cliente
         if not auth or 'token' not in auth:
-            print("No se proporcionó token")
+            handshake.metricas['rechazados'] += 1
+            logger.info('conexion_rechazada', extra=campos(sid=sid, motivo='sin_token'))
             await sio.disconnect(sid)
             return
         
-        token = auth['token']
-        user_data = await validate_token(token)
+        # Firma y expiración en el loop; el usuario sale de la caché, los claims o el executor propio
+        user_data = await handshake.autenticar(auth['token'])
         
         if not user_data:
-            print("Token inválido o usuario inactivo")
+            logger.info('conexion_rechazada', extra=campos(sid=sid, motivo='token_invalido'))
             await sio.disconnect(sid)
             return
         
         # Guardar el user_id en la sesión de socket
+        user_data['agrupar'] = agrupa_eventos(auth)
         await sio.save_session(sid, user_data)
-        print(f"Usuario {user_data['username']} (ID: {user_data['user_id']}) conectado con sid {sid}")
+        for sala in salas_de_sesion(user_data):
+            await sio.enter_room(sid, sala_lote(sala) if user_data['agrupar'] else sala)
+        logger.info('conectado', extra=campos(
+            sid=sid, usuario=user_data['user_id'], username=user_data['username'], agrupar=user_data['agrupar']
+        ))
             
-    except Exception as e:
-        print(f"Error en conexión: {e}")
+    except Exception:
+        logger.exception('error_conexion', extra=campos(sid=sid))
         await sio.disconnect(sid)
 
 @sio.event
 async def disconnect(sid):
-    print(f"Cliente {sid} desconectado")
+    logger.info('desconectado', extra=campos(sid=sid))
+
+def _salas_suscripcion(data):
+    """Salas de mesa/pedido pedidas por el cliente: {'mesas': [...], 'pedidos': [...]}"""
+    if not isinstance(data, dict):
+        return []
+    salas = []
+    for clave, sala in (('mesas', sala_mesa), ('pedidos', sala_pedido)):
+        for valor in data.get(clave) or []:
+            try:
+                salas.append(sala(int(valor)))
+            except (TypeError, ValueError):
+                continue
+    return salas
+
+def _sala_de_cliente(session, sala):
+    """Nombre real de la sala según si la sesión recibe eventos agrupados"""
+    return sala_lote(sala) if session.get('agrupar') else sala
+
+# Grupos cuyas salas ya reciben todos los eventos de pedidos y órdenes
+GRUPOS_SIN_RESTRICCION = {'Cocinero', 'Administrador', 'Gerente'}
+
+@database_sync_to_async
+def salas_autorizadas(session, salas):
+    """
+    Salas de mesa/pedido que la sesión puede seguir: cocina y gerencia
+    cualquiera, los meseros sus propios pedidos y las mesas donde tienen un
+    pedido sin pagar, el resto ninguna
+    """
+    grupos = set(session.get('grupos', ()))
+    if session.get('is_superuser') or GRUPOS_SIN_RESTRICCION & grupos:
+        return salas
+    if 'Mesero' not in grupos or not salas:
+        return []
+    ids = {'mesa': set(), 'pedido': set()}
+    for sala in salas:
+        tipo, _, valor = sala.partition(':')
+        ids[tipo].add(int(valor))
+    propios = Pedido.objects.filter(usuario_id=session['user_id'])
+    permitidas = {sala_pedido(pedido_id) for pedido_id in propios.filter(id__in=ids['pedido']).values_list('id', flat=True)}
+    permitidas.update(
+        sala_mesa(mesa_id) for mesa_id in
+        propios.filter(mesa_id__in=ids['mesa'], hora_pago__isnull=True).values_list('mesa_id', flat=True)
+    )
+    return [sala for sala in salas if sala in permitidas]
+
+@sio.event
+async def suscribir(sid, data):
+    """El cliente pide recibir los eventos de ciertas mesas o pedidos que le correspondan"""
+    salas = _salas_suscripcion(data)
+    session = await sio.get_session(sid)
+    permitidas = await salas_autorizadas(session, salas)
+    for sala in permitidas:
+        await sio.enter_room(sid, _sala_de_cliente(session, sala))
+    rechazadas = [sala for sala in salas if sala not in permitidas]
+    if rechazadas:
+        logger.info('suscripcion_rechazada', extra=campos(
+            sid=sid, usuario=session.get('user_id'), salas=','.join(rechazadas)
+        ))
+    return {'salas': permitidas, 'rechazadas': rechazadas}
+
+@sio.event
+async def desuscribir(sid, data):
+    """Sale de las mesas o pedidos indicados; solo de los que el socket sigue"""
+    session = await sio.get_session(sid)
+    actuales = set(sio.rooms(sid))
+    salas = [sala for sala in _salas_suscripcion(data) if _sala_de_cliente(session, sala) in actuales]
+    for sala in salas:
+        await sio.leave_room(sid, _sala_de_cliente(session, sala))
+    return {'salas': salas}
+
+@sio.on('metricas')
+async def metricas_socket(sid, data=None):
+    """Evento de administración: métricas del proceso (ver core.metricas.resumen_socket)"""
+    session = await sio.get_session(sid)
+    if not (session.get('is_superuser') or {'Administrador', 'Gerente'} & set(session.get('grupos', ()))):
+        return {'error': 'Solo disponible para gerentes y administradores'}
+    return metricas.resumen_socket()
 
 # Importa modelos aquí para evitar importaciones circulares
+from django.db.models import Prefetch
+from core import catalogo
 from core.models import Orden, Pedido
 
-# Funciones asíncronas para acceder a la base de datos
+# Carga de payloads: funciones síncronas por lote (las usa el despachador de
+# core.outbox) y envoltorios asíncronos para una sola fila
+def _datos_menu_item(orden):
+    # Ítems y estados salen del catálogo en memoria (core.catalogo), sin JOIN
+    item = catalogo.menu_item(orden.menu_item_id)
+    return {
+        'id': str(orden.menu_item_id),
+        'nombre': item.nombre if item else None,
+        'precio': float(orden.precio_unitario)
+    }
+
+def _datos_estado(orden):
+    estado = catalogo.estado(orden.estado_id)
+    return {
+        'id': str(orden.estado_id),
+        'nombre': estado.nombre if estado else None
+    }
+
+def _datos_orden(orden):
+    return {
+        'id': str(orden.id),
+        'pedido': str(orden.pedido_id),
+        'mesa': str(orden.pedido.mesa_id),
+        'usuario': str(orden.pedido.usuario_id),
+        'menu_item': _datos_menu_item(orden),
+        'estado': _datos_estado(orden),
+        'anotacion': orden.anotacion,
+        'hora_creacion': orden.hora_creacion.isoformat() if orden.hora_creacion else None,
+        'hora_entrega': orden.hora_entrega.isoformat() if orden.hora_entrega else None,
+    }
+
+def _datos_pedido(pedido):
+    mesa = catalogo.mesa(pedido.mesa_id)
+    return {
+        'id': str(pedido.id),
+        'mesa': {
+            'id': str(pedido.mesa_id),
+            'numero': mesa.numero if mesa else None
+        },
+        'subtotal': float(pedido.subtotal),
+        'total': float(pedido.total),
+        'fecha_creacion': pedido.fecha_creacion.isoformat() if pedido.fecha_creacion else None,
+        'hora_creacion': pedido.hora_creacion.isoformat() if pedido.hora_creacion else None,
+        'hora_pago': pedido.hora_pago.isoformat() if pedido.hora_pago else None,
+        'usuario': str(pedido.usuario_id),
+        'ordenes': [
+            {
+                'id': str(orden.id),
+                'menu_item': _datos_menu_item(orden),
+                'estado': _datos_estado(orden),
+                'anotacion': orden.anotacion,
+            }
+            for orden in pedido.ordenes.all()
+        ],
+    }
+
+def datos_ordenes(ids):
+    """{id: payload} de las órdenes que aún existen"""
+    ordenes = Orden.objects.select_related('pedido').filter(id__in=ids)
+    return {orden.id: _datos_orden(orden) for orden in ordenes}
+
+def datos_pedidos(ids):
+    pedidos = Pedido.objects.filter(id__in=ids).prefetch_related(
+        Prefetch('ordenes', queryset=Orden.objects.order_by('id'))
+    )
+    return {pedido.id: _datos_pedido(pedido) for pedido in pedidos}
+
+# Eventos publicables: nombre -> (carga por lote, salas destino del payload)
+EVENTOS = {
+    'orden_actualizada': (
+        datos_ordenes,
+        lambda data: salas_de_evento(data['pedido'], data['mesa'], data['usuario'])
+    ),
+    'pedido_creado': (
+        datos_pedidos,
+        lambda data: salas_de_evento(data['id'], data['mesa']['id'], data['usuario'])
+    ),
+}
+
+async def publicar(evento, data):
+    """
+    Envía un payload ya cargado a las salas que le corresponden. Los clientes
+    con entrega agrupada lo reciben en el siguiente lote si el evento es
+    agrupable, o de inmediato en sus salas "#lote" si no lo es.
+    """
+    salas = EVENTOS[evento][1](data)
+    if settings.SOCKETIO_AGRUPACION_MS and evento not in AGRUPABLES:
+        salas = salas + [sala_lote(sala) for sala in salas]
+    metricas.observar_emision(sio.manager, evento, salas)
+    await sio.emit(evento, data, to=salas)
+    if settings.SOCKETIO_AGRUPACION_MS and evento in AGRUPABLES:
+        agrupador.agregar(AGRUPABLES[evento], salas, data)
+
 @database_sync_to_async
 def get_orden_data(orden_id):
     try:
-        orden = Orden.objects.get(id=orden_id)
-        return {
-            'id': str(orden.id),
-            'pedido': str(orden.pedido.id),
-            'menu_item': {
-                'id': str(orden.menu_item.id),
-                'nombre': orden.menu_item.nombre,
-                'precio': float(orden.menu_item.precio)
-            },
-            'estado': {
-                'id': str(orden.estado.id),
-                'nombre': orden.estado.nombre
-            },
-            'anotacion': orden.anotacion,
-            'hora_creacion': orden.hora_creacion.isoformat() if orden.hora_creacion else None,
-            'hora_entrega': orden.hora_entrega.isoformat() if orden.hora_entrega else None,
-        }
-    except Orden.DoesNotExist:
-        return None
-    except Exception as e:
-        print(f"Error al obtener datos de orden: {e}")
+        return datos_ordenes([int(orden_id)]).get(int(orden_id))
+    except Exception:
+        logger.exception('error_datos', extra=campos(evento='orden_actualizada', id=orden_id))
         return None
 
 @database_sync_to_async
 def get_pedido_data(pedido_id):
     try:
-        pedido = Pedido.objects.get(id=pedido_id)
-        return {
-            'id': str(pedido.id),
-            'mesa': {
-                'id': str(pedido.mesa.id),
-                'numero': pedido.mesa.numero
-            },
-            'subtotal': float(pedido.subtotal),
-            'total': float(pedido.total),
-            'fecha_creacion': pedido.fecha_creacion.isoformat() if pedido.fecha_creacion else None,
-            'hora_creacion': pedido.hora_creacion.isoformat() if pedido.hora_creacion else None,
-            'hora_pago': pedido.hora_pago.isoformat() if pedido.hora_pago else None,
-        }
-    except Pedido.DoesNotExist:
-        return None
-    except Exception as e:
-        print(f"Error al obtener datos de pedido: {e}")
+        return datos_pedidos([int(pedido_id)]).get(int(pedido_id))
+    except Exception:
+        logger.exception('error_datos', extra=campos(evento='pedido_creado', id=pedido_id))
         return None
 
 # Función para emitir actualización de orden
@@ -133,21 +304,21 @@ async def emitir_orden_actualizada(orden_id):
     try:
         data = await get_orden_data(orden_id)
         if data:
-            await sio.emit('orden_actualizada', data)
-            print(f"Orden {orden_id} actualizada y emitida")
+            await publicar('orden_actualizada', data)
+            logger.debug('emitido', extra=campos(evento='orden_actualizada', id=orden_id))
         else:
-            print(f"Orden {orden_id} no encontrada")
-    except Exception as e:
-        print(f"Error al emitir orden actualizada: {e}")
+            logger.info('no_encontrado', extra=campos(evento='orden_actualizada', id=orden_id))
+    except Exception:
+        logger.exception('error_emision', extra=campos(evento='orden_actualizada', id=orden_id))
 
 # Función para emitir nuevo pedido
 async def emitir_pedido_creado(pedido_id):
     try:
         data = await get_pedido_data(pedido_id)
         if data:
-            await sio.emit('pedido_creado', data)
-            print(f"Pedido {pedido_id} creado y emitido")
+            await publicar('pedido_creado', data)
+            logger.debug('emitido', extra=campos(evento='pedido_creado', id=pedido_id))
         else:
-            print(f"Pedido {pedido_id} no encontrado")
-    except Exception as e:
-        print(f"Error al emitir pedido creado: {e}")
\ No newline at end of file
+            logger.info('no_encontrado', extra=campos(evento='pedido_creado', id=pedido_id))
+    except Exception:
+        logger.exception('error_emision', extra=campos(evento='pedido_creado', id=pedido_id))
\ No newline at end of file
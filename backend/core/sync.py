@@ -0,0 +1,151 @@
+"""
+Sincronización incremental de pedidos y órdenes.
+
+Cada guardado de un Pedido u Orden toma la siguiente versión de un contador
+global (ContadorCambios id=1) y la guarda en `version`; los borrados dejan una
+lápida en Eliminacion con su propia versión. Un cliente que conoce la
+versión `since` pide solo lo que cambió después, y recibe un token nuevo.
+
+`siguiente_version()` solo se puede llamar dentro de la transacción que
+escribe las filas: Pedido.save y Orden.save abren una (core.models.ConVersion),
+los borrados corren dentro de la del Collector y los caminos en bloque
+(core.pedidos, cambiar_estado_lote, verificar_totales) usan la suya. La fila
+del contador queda bloqueada hasta el commit, así que otra escritura espera
+para tomar la versión siguiente y un lector nunca ve en el contador una
+versión cuya fila aún no se confirmó: el tope leído en `cambios_desde()`
+nunca supera la menor versión sin confirmar.
+
+Las lápidas se podan tras SYNC_RETENCION_LAPIDAS días (`podar_lapidas()`,
+comando podar_lapidas). La mayor versión podada queda en ContadorCambios
+id=4; un token anterior a ella ya no puede saber qué se borró y recibe una
+sincronización completa (`completo`).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, F, Max, Value, When
+from django.utils import timezone
+
+from .models import ContadorCambios, Eliminacion, Orden, Pedido
+from .values_serializers import OrdenValuesSerializer, PedidoValuesSerializer
+
+LIMITE_POR_DEFECTO = 1000
+LIMITE_MAXIMO = 5000
+
+CONTADOR = 1
+# Mayor versión de las lápidas ya podadas
+HORIZONTE = 4
+
+MODELOS = {
+    'pedidos': (Pedido, PedidoValuesSerializer),
+    'ordenes': (Orden, OrdenValuesSerializer),
+}
+
+
+def siguiente_version(cantidad=1):
+    """
+    Reserva `cantidad` versiones consecutivas y devuelve la primera. Debe
+    llamarse dentro de la transacción que escribe las filas versionadas.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        raise transaction.TransactionManagementError(
+            "siguiente_version() debe llamarse dentro de la transacción que escribe las filas"
+        )
+    if not ContadorCambios.objects.filter(id=CONTADOR).update(valor=F('valor') + cantidad):
+        ContadorCambios.objects.get_or_create(id=CONTADOR)
+        ContadorCambios.objects.filter(id=CONTADOR).update(valor=F('valor') + cantidad)
+    return ContadorCambios.objects.values_list('valor', flat=True).get(id=CONTADOR) - cantidad + 1
+
+
+def versiones_por_id(ids):
+    """
+    Expresión para un UPDATE en bloque (que no pasa por las señales) que da a
+    cada fila de `ids` una versión nueva y distinta. Se reservan exactamente
+    len(ids) versiones y se reparten en orden de id, sin dejar huecos en el
+    contador.
+    """
+    ids = sorted(set(ids))
+    primera = siguiente_version(len(ids))
+    return Case(
+        *(When(id=objeto_id, then=Value(primera + posicion)) for posicion, objeto_id in enumerate(ids)),
+        output_field=BigIntegerField(),
+    )
+
+
+def version_actual():
+    return ContadorCambios.objects.filter(id=CONTADOR).values_list('valor', flat=True).first() or 0
+
+
+def registrar_eliminacion(modelo, objeto_id):
+    Eliminacion.objects.create(modelo=modelo, objeto_id=objeto_id, version=siguiente_version())
+
+
+def podar_lapidas(dias=None):
+    """
+    Borra las lápidas con más de `dias` (SYNC_RETENCION_LAPIDAS por defecto)
+    y sube el horizonte hasta la mayor versión borrada. Devuelve cuántas borró.
+    """
+    dias = settings.SYNC_RETENCION_LAPIDAS if dias is None else dias
+    with transaction.atomic():
+        corte = Eliminacion.objects.filter(
+            creado__lt=timezone.now() - timedelta(days=dias)
+        ).aggregate(version=Max('version'))['version']
+        if corte is None:
+            return 0
+        # Por versión y no por fecha, para que el horizonte sea exacto
+        borradas, _ = Eliminacion.objects.filter(version__lte=corte).delete()
+        horizonte, _ = ContadorCambios.objects.select_for_update().get_or_create(id=HORIZONTE)
+        if corte > horizonte.valor:
+            horizonte.valor = corte
+            horizonte.save(update_fields=['valor'])
+    return borradas
+
+
+def cambios_desde(since, limite=LIMITE_POR_DEFECTO):
+    """
+    Cambios con versión mayor que `since`, como máximo `limite` por tipo.
+
+    Si algún tipo llega al límite, la respuesta se corta en la menor versión
+    alcanzada para no saltarse cambios, y `hay_mas` indica que el cliente
+    debe volver a pedir con el token devuelto. Si `since` es anterior a las
+    lápidas podadas se responde desde cero con `completo`: el cliente debe
+    reemplazar su copia en lugar de mezclarla.
+    """
+    # Leer el tope antes que las filas: lo que se escriba después llegará en la
+    # próxima llamada, y lo que aún no se confirmó tiene versión mayor (ver arriba)
+    contadores = dict(ContadorCambios.objects.filter(id__in=(CONTADOR, HORIZONTE)).values_list('id', 'valor'))
+    tope = contadores.get(CONTADOR, 0)
+    if since and since < contadores.get(HORIZONTE, 0):
+        since = 0
+    completo = not since
+    lotes = {}
+    corte = tope
+    hay_mas = False
+    for nombre, (modelo, values_class) in MODELOS.items():
+        values_serializer = values_class()
+        filas = list(values_serializer.valores(
+            modelo.objects.filter(version__gt=since, version__lte=tope).order_by('version')
+        )[:limite])
+        eliminados = list(
+            Eliminacion.objects.filter(modelo=nombre, version__gt=since, version__lte=tope)
+            .order_by('version').values_list('version', 'objeto_id')[:limite]
+        )
+        for lote in (filas, eliminados):
+            if len(lote) == limite:
+                hay_mas = True
+                ultima = lote[-1]['version'] if isinstance(lote[-1], dict) else lote[-1][0]
+                corte = min(corte, ultima)
+        lotes[nombre] = (values_serializer, filas, eliminados)
+
+    resultado = {'token': str(corte), 'hay_mas': hay_mas, 'completo': completo}
+    for nombre, (values_serializer, filas, eliminados) in lotes.items():
+        filas = [fila for fila in filas if fila['version'] <= corte]
+        creados = [fila for fila in filas if fila['version_creacion'] > since]
+        actualizados = [fila for fila in filas if fila['version_creacion'] <= since]
+        resultado[nombre] = {
+            'creados': values_serializer.serializar(creados),
+            'actualizados': values_serializer.serializar(actualizados),
+            'eliminados': [objeto_id for version, objeto_id in eliminados if version <= corte],
+        }
+    return resultado
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DashboardVentasAPI, DashboardProductosAPI, DashboardUsuariosAPI
+from .views import DashboardVentasAPI, DashboardProductosAPI, DashboardUsuariosAPI, MetricasAPI, SyncAPI
 from .views import (
     UserViewSet,
     GroupViewSet,
@@ -30,4 +30,6 @@ urlpatterns = [
     path('dashboard/ventas/', DashboardVentasAPI.as_view(), name='dashboard-ventas'),
     path('dashboard/productos/', DashboardProductosAPI.as_view(), name='dashboard-productos'),
     path('dashboard/usuarios/', DashboardUsuariosAPI.as_view(), name='dashboard-usuarios'),
+    path('sync/', SyncAPI.as_view(), name='sync'),
+    path('metrics/', MetricasAPI.as_view(), name='metricas'),
 ]
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""
+Camino rápido de solo lectura para los listados calientes.
+
+Construye las respuestas directamente desde filas de `.values()` en lugar de
+instanciar modelos y pasar por `ModelSerializer.to_representation`. El plan
+de cada campo se deriva del serializer de referencia, reutilizando su
+`to_representation` para los valores escalares, así que el JSON resultante
+es idéntico (mismas claves, mismo orden, mismos formatos). Los ManyToMany
+anidados se resuelven con una sola consulta sobre la tabla intermedia.
+"""
+from types import SimpleNamespace
+
+from rest_framework import serializers
+
+from .metricas import medir_serializacion
+from .serializers import MenuItemDetailSerializer, OrdenSerializer, PedidoSerializer
+
+
+class ValuesSerializer:
+    """
+    Serializa filas de `.values()` con la misma forma que `serializer_class`.
+
+    Soporta campos escalares, claves foráneas como PK, `SerializerMethodField`
+    (el método recibe un objeto con los atributos de la fila) y serializers
+    anidados `many=True` sobre relaciones ManyToMany.
+    """
+    serializer_class = None
+
+    def __init__(self):
+        serializer = self.serializer_class()
+        model = self.serializer_class.Meta.model
+        self.campos = []     # (nombre, tipo, dato)
+        self.fuentes = []    # columnas a pedir a .values()
+        for nombre, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                self.campos.append((nombre, 'metodo', getattr(serializer, field.method_name)))
+            elif isinstance(field, serializers.ListSerializer):
+                relacion = model._meta.get_field(field.source)
+                self.campos.append((nombre, 'm2m', (relacion, _hijo(field.child))))
+            elif isinstance(field, serializers.PrimaryKeyRelatedField):
+                self.campos.append((nombre, 'pk', field.source))
+                self.fuentes.append(field.source)
+            else:
+                self.campos.append((nombre, 'valor', (field.source, field.to_representation)))
+                self.fuentes.append(field.source)
+
+        # Los métodos pueden leer cualquier campo concreto del modelo
+        if any(tipo == 'metodo' for _, tipo, _ in self.campos):
+            for field in model._meta.concrete_fields:
+                if field.attname not in self.fuentes and field.name not in self.fuentes:
+                    self.fuentes.append(field.name)
+        if model._meta.pk.name not in self.fuentes:
+            self.fuentes.append(model._meta.pk.name)
+
+    def valores(self, queryset):
+        """Queryset de dicts con las columnas necesarias (apto para paginar por cursor)"""
+        return queryset.prefetch_related(None).values(*self.fuentes)
+
+    def serializar(self, filas):
+        with medir_serializacion():
+            return self._serializar(filas)
+
+    def _serializar(self, filas):
+        filas = list(filas)
+        relacionados = {
+            nombre: _cargar_m2m(relacion, hijo, [fila['id'] for fila in filas])
+            for nombre, tipo, (relacion, hijo) in (c for c in self.campos if c[1] == 'm2m')
+        }
+        resultado = []
+        for fila in filas:
+            objeto = None
+            datos = {}
+            for nombre, tipo, dato in self.campos:
+                if tipo == 'valor':
+                    fuente, convertir = dato
+                    valor = fila[fuente]
+                    datos[nombre] = None if valor is None else convertir(valor)
+                elif tipo == 'pk':
+                    datos[nombre] = fila[dato]
+                elif tipo == 'metodo':
+                    if objeto is None:
+                        objeto = SimpleNamespace(**fila)
+                    datos[nombre] = dato(objeto)
+                else:
+                    datos[nombre] = relacionados[nombre].get(fila['id'], [])
+            resultado.append(datos)
+        return resultado
+
+
+def _hijo(serializer):
+    """ValuesSerializer para un serializer anidado"""
+    return type(f'{type(serializer).__name__}Values', (ValuesSerializer,), {'serializer_class': type(serializer)})()
+
+
+def _cargar_m2m(relacion, hijo, ids):
+    """Una consulta sobre la tabla intermedia: {id_origen: [representación de cada destino]}"""
+    if not ids:
+        return {}
+    through = relacion.remote_field.through
+    origen = relacion.m2m_field_name()
+    destino = relacion.m2m_reverse_field_name()
+    columnas = {fuente: f'{destino}__{fuente}' for fuente in hijo.fuentes}
+    filas = through.objects.filter(**{f'{origen}_id__in': ids}).order_by(f'{destino}_id').values(
+        f'{origen}_id', *columnas.values()
+    )
+    agrupado = {}
+    for fila in filas:
+        valores = {fuente: fila[columna] for fuente, columna in columnas.items()}
+        agrupado.setdefault(fila[f'{origen}_id'], []).append(valores)
+    return {
+        id_origen: hijo.serializar(destinos)
+        for id_origen, destinos in agrupado.items()
+    }
+
+
+class OrdenValuesSerializer(ValuesSerializer):
+    serializer_class = OrdenSerializer
+
+
+class PedidoValuesSerializer(ValuesSerializer):
+    serializer_class = PedidoSerializer
+
+
+class MenuItemValuesSerializer(ValuesSerializer):
+    serializer_class = MenuItemDetailSerializer
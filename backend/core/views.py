@@ -1,13 +1,16 @@
+import hashlib
+
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from django.contrib.auth.models import User, Group
-from .models import Componente, MenuItem, Estado, Mesa, Cliente, Pedido, Orden
+from .models import Componente, MenuItem, Estado, Mesa, Cliente, Pedido, Orden, ResumenVentaHora, ResumenProductoHora
 from rest_framework.views import APIView
-from django.db.models import Count, Sum, Avg, F, ExpressionWrapper, FloatField
+from django.db.models import Count, Sum, Avg, F, Q, ExpressionWrapper, FloatField, BooleanField, Prefetch
 from django.db.models.functions import TruncDate, TruncHour, TruncMonth, TruncWeek
 from django.utils import timezone
-from datetime import timedelta, datetime
+from datetime import timedelta, datetime, time
 from .serializers import (
     UserSerializer,
     GroupSerializer,
@@ -19,282 +22,397 @@ from .serializers import (
     ClienteSerializer, 
     PedidoSerializer, 
     PedidoDetailSerializer,
+    PedidoCreateSerializer,
     OrdenSerializer,
     OrdenDetailSerializer
 )
-from rest_framework.permissions import BasePermission, IsAuthenticated, DjangoModelPermissions
-import asyncio
-from asgiref.sync import async_to_sync
-from .socketio_server import emitir_orden_actualizada, emitir_pedido_creado
+from rest_framework.permissions import BasePermission, IsAuthenticated
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from . import catalogo, dashboard, metricas, outbox, roles, sync
+from .permissions import IsAdministrador, IsGerente, PermisosModelo, PuedeCambiarOrdenes, TokenMetricas
+from .pagination import IdCursorPagination
+from .dashboard import DashboardAPIView, PERIODO_POR_DEFECTO, fecha_inicio
+from .values_serializers import MenuItemValuesSerializer, OrdenValuesSerializer, PedidoValuesSerializer
 
-class DashboardVentasAPI(APIView):
-    permission_classes = [permissions.IsAuthenticated]
-    
-    def get(self, request):
-        # Verificar si el usuario tiene permisos de gerente o admin
-        user = request.user
-        if not (user.is_superuser or user.groups.filter(name__in=['Administrador', 'Gerente']).exists()):
-            return Response({"error": "No tienes permisos para ver el dashboard"}, status=status.HTTP_403_FORBIDDEN)
-        
+class DashboardVentasAPI(DashboardAPIView):
+    endpoint = 'ventas'
+    GRANULARIDADES = ('hour', 'day', 'week', 'month')
+    # Límite de buckets para evitar respuestas gigantes con rangos arbitrarios
+    MAX_BUCKETS = 5000
+
+    def parametros(self, query_params):
+        """Obtiene desde, hasta y granularidad a partir de periodo, desde/hasta y granularidad"""
         # Obtener período desde los parámetros de la consulta
-        periodo = request.query_params.get('periodo', 'semana')
-        
-        # Calcular fecha de inicio según el período
-        now = timezone.now()
+        periodo = query_params.get('periodo', PERIODO_POR_DEFECTO)
+
+        hoy = timezone.localdate()
         if periodo == 'dia':
-            dias_atras = 1
-            # Para vista por horas en un día
-            fecha_inicio = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            # Agrupar por hora para vista diaria
-            ventas_data = []
-            # Crear 24 horas para el día actual
-            for hour in range(24):
-                hora_inicio = fecha_inicio.replace(hour=hour)
-                hora_fin = hora_inicio + timedelta(hours=1)
-                
-                # Consultar ventas para esta hora
-                subtotal = Pedido.objects.filter(
-                    hora_creacion__gte=hora_inicio,
-                    hora_creacion__lt=hora_fin
-                ).aggregate(
-                    total_ventas=Sum('total'),
-                    cantidad_pedidos=Count('id')
-                )
-                
-                ventas_data.append({
-                    'periodo': hora_inicio.isoformat(),
-                    'total_ventas': subtotal['total_ventas'] or 0,
-                    'cantidad_pedidos': subtotal['cantidad_pedidos'] or 0
-                })
-                
-            ventas = ventas_data
+            # Vista por horas del día actual
+            desde, hasta, granularidad = hoy, hoy, 'hour'
         else:
-            # Para vistas por día (semana, mes, trimestre)
-            if periodo == 'semana':
-                dias_atras = 7
-            elif periodo == 'mes':
-                dias_atras = 30
-            elif periodo == 'trimestre':
-                dias_atras = 90
-            else:
-                dias_atras = 7
-                
-            fecha_inicio = now - timedelta(days=dias_atras)
-            
-            # Crear un arreglo de días desde fecha_inicio hasta hoy
-            ventas_data = []
-            current_date = fecha_inicio.date()
-            end_date = now.date()
-            
-            while current_date <= end_date:
-                # Inicio y fin del día
-                dia_inicio = timezone.make_aware(datetime.combine(current_date, datetime.min.time()))
-                dia_fin = timezone.make_aware(datetime.combine(current_date, datetime.max.time()))
-                
-                # Consultar ventas para este día
-                subtotal = Pedido.objects.filter(
-                    fecha_creacion=current_date
-                ).aggregate(
-                    total_ventas=Sum('total'),
-                    cantidad_pedidos=Count('id')
-                )
-                
-                ventas_data.append({
-                    'periodo': dia_inicio.isoformat(),
-                    'total_ventas': subtotal['total_ventas'] or 0,
-                    'cantidad_pedidos': subtotal['cantidad_pedidos'] or 0
-                })
-                
-                current_date += timedelta(days=1)
-                
-            ventas = ventas_data
-        
-        # Calcular resumen de ventas
+            desde, hasta, granularidad = fecha_inicio(periodo), hoy, 'day'
+
+        # Un rango explícito tiene prioridad sobre el período
+        if query_params.get('desde'):
+            desde = self._parse_fecha(query_params['desde'], 'desde')
+        if query_params.get('hasta'):
+            hasta = self._parse_fecha(query_params['hasta'], 'hasta')
+        if desde > hasta:
+            raise ValueError("'desde' no puede ser posterior a 'hasta'")
+
+        granularidad = query_params.get('granularidad', granularidad)
+        if granularidad not in self.GRANULARIDADES:
+            raise ValueError(f"Granularidad inválida, opciones: {', '.join(self.GRANULARIDADES)}")
+        if len(self._buckets(desde, hasta, granularidad)) > self.MAX_BUCKETS:
+            raise ValueError("El rango solicitado genera demasiados periodos")
+
+        return {'desde': desde, 'hasta': hasta, 'granularidad': granularidad}
+
+    def calcular(self, desde, hasta, granularidad):
+        # El período anterior tiene la misma duración y termina justo antes de `desde`
+        duracion = hasta - desde + timedelta(days=1)
+        anterior_desde = desde - duracion
+
+        # Una sola consulta agrupada sobre el rollup por hora: período actual y anterior, separados por `actual`
+        campos = {'actual': ExpressionWrapper(Q(fecha__gte=desde), output_field=BooleanField())}
+        if granularidad == 'hour':
+            campos['dia'] = F('fecha')
+            campos['hora_bucket'] = F('hora')
+        elif granularidad == 'day':
+            campos['dia'] = F('fecha')
+        elif granularidad == 'week':
+            campos['dia'] = TruncWeek('fecha')
+        else:
+            campos['dia'] = TruncMonth('fecha')
+
+        filas = ResumenVentaHora.objects.filter(
+            fecha__gte=anterior_desde,
+            fecha__lte=hasta
+        ).values(**campos).annotate(
+            total_ventas=Sum('total_ventas'),
+            cantidad_pedidos=Sum('cantidad_pedidos')
+        ).order_by()
+
+        agrupado = {}
+        ventas_periodo_anterior = 0
+        for fila in filas:
+            if not fila['actual']:
+                ventas_periodo_anterior += fila['total_ventas'] or 0
+                continue
+            clave = self._clave(fila, granularidad)
+            acumulado = agrupado.setdefault(clave, [0, 0])
+            acumulado[0] += fila['total_ventas'] or 0
+            acumulado[1] += fila['cantidad_pedidos'] or 0
+
+        # Rellenar en Python los periodos sin ventas
+        ventas = []
+        for bucket in self._buckets(desde, hasta, granularidad):
+            total_ventas, cantidad_pedidos = agrupado.get(bucket, (0, 0))
+            ventas.append({
+                'periodo': bucket.isoformat(),
+                'total_ventas': total_ventas,
+                'cantidad_pedidos': cantidad_pedidos
+            })
+
+        # Calcular resumen de ventas a partir de los buckets
         resumen = {
-            'total_ventas': Pedido.objects.filter(fecha_creacion__gte=fecha_inicio.date()).aggregate(total=Sum('total'))['total'] or 0,
-            'cantidad_pedidos': Pedido.objects.filter(fecha_creacion__gte=fecha_inicio.date()).count(),
+            'total_ventas': sum(total for total, _ in agrupado.values()),
+            'cantidad_pedidos': sum(cantidad for _, cantidad in agrupado.values()),
             'ticket_promedio': 0
         }
-        
+
         # Calcular ticket promedio (evitar división por cero)
         if resumen['cantidad_pedidos'] > 0:
             resumen['ticket_promedio'] = resumen['total_ventas'] / resumen['cantidad_pedidos']
-        
+
         # Calcular tendencia (comparar con período anterior)
-        periodo_anterior_inicio = fecha_inicio - timedelta(days=dias_atras)
-        ventas_periodo_actual = resumen['total_ventas']
-        ventas_periodo_anterior = Pedido.objects.filter(
-            fecha_creacion__gte=periodo_anterior_inicio.date(),
-            fecha_creacion__lt=fecha_inicio.date()
-        ).aggregate(total=Sum('total'))['total'] or 0
-        
         if ventas_periodo_anterior > 0:
-            tendencia = ((ventas_periodo_actual - ventas_periodo_anterior) / ventas_periodo_anterior) * 100
+            tendencia = ((resumen['total_ventas'] - ventas_periodo_anterior) / ventas_periodo_anterior) * 100
         else:
             tendencia = 100  # Si no hay ventas anteriores, mostrar 100% de incremento
-        
+
         resumen['tendencia'] = round(tendencia, 2)
-        
-        return Response({
+
+        return {
             'ventas': ventas,
-            'resumen': resumen
-        })
+            'resumen': resumen,
+            'granularidad': granularidad,
+            'desde': desde.isoformat(),
+            'hasta': hasta.isoformat()
+        }
 
-class DashboardProductosAPI(APIView):
-    permission_classes = [permissions.IsAuthenticated]
-    
-    def get(self, request):
-        # Verificar permisos
-        user = request.user
-        if not (user.is_superuser or user.groups.filter(name__in=['Administrador', 'Gerente']).exists()):
-            return Response({"error": "No tienes permisos para ver el dashboard"}, status=status.HTTP_403_FORBIDDEN)
-        
-        # Obtener período desde los parámetros de la consulta
-        periodo = request.query_params.get('periodo', 'semana')
-        
-        # Definir días atrás según el período
-        if periodo == 'dia':
-            dias_atras = 1
-        elif periodo == 'semana':
-            dias_atras = 7
-        elif periodo == 'mes':
-            dias_atras = 30
-        elif periodo == 'trimestre':
-            dias_atras = 90
+    def _parse_fecha(self, valor, nombre):
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError(f"Fecha '{nombre}' inválida, formato esperado AAAA-MM-DD")
+
+    def _buckets(self, desde, hasta, granularidad):
+        """Lista ordenada de inicios de periodo (datetime aware) entre desde y hasta"""
+        if granularidad == 'week':
+            actual = desde - timedelta(days=desde.weekday())
+        elif granularidad == 'month':
+            actual = desde.replace(day=1)
         else:
-            dias_atras = 7
-        
-        fecha_inicio = timezone.now() - timedelta(days=dias_atras)
-        
-        # Productos más vendidos en el período
-        productos_populares = MenuItem.objects.filter(
-            orden__pedido__fecha_creacion__gte=fecha_inicio
+            actual = desde
+
+        buckets = []
+        while actual <= hasta:
+            inicio = timezone.make_aware(datetime.combine(actual, datetime.min.time()))
+            if granularidad == 'hour':
+                buckets.extend(inicio + timedelta(hours=hora) for hora in range(24))
+            else:
+                buckets.append(inicio)
+
+            if granularidad == 'week':
+                actual += timedelta(days=7)
+            elif granularidad == 'month':
+                actual = (actual.replace(day=28) + timedelta(days=4)).replace(day=1)
+            else:
+                actual += timedelta(days=1)
+        return buckets
+
+    def _clave(self, fila, granularidad):
+        """Convierte una fila agrupada en el inicio de su bucket"""
+        dia = fila['dia']
+        if isinstance(dia, datetime):
+            dia = dia.date()
+        inicio = timezone.make_aware(datetime.combine(dia, datetime.min.time()))
+        if granularidad == 'hour':
+            inicio += timedelta(hours=fila['hora_bucket'])
+        return inicio
+
+class DashboardProductosAPI(DashboardAPIView):
+    endpoint = 'productos'
+
+    def calcular(self, desde):
+        # Productos más vendidos en el período, leídos del rollup por hora
+        productos_populares = ResumenProductoHora.objects.filter(
+            fecha__gte=desde
+        ).values(
+            'menu_item_id', 'menu_item__nombre'
         ).annotate(
-            veces_ordenado=Count('orden'),
-            total_ventas=Sum('orden__pedido__total')
-        ).order_by('-veces_ordenado')[:10]
+            veces_ordenado=Sum('cantidad_ordenes'),
+            total_ventas=Sum('total_ventas')
+        ).filter(veces_ordenado__gt=0).order_by('-veces_ordenado')[:10]
         
-        return Response({
+        return {
             'productos_populares': [
                 {
-                    'id': producto.id,
-                    'nombre': producto.nombre,
-                    'veces_ordenado': producto.veces_ordenado,
-                    'total_ventas': producto.total_ventas or 0
+                    'id': producto['menu_item_id'],
+                    'nombre': producto['menu_item__nombre'],
+                    'veces_ordenado': producto['veces_ordenado'],
+                    'total_ventas': producto['total_ventas'] or 0
                 }
                 for producto in productos_populares
             ]
-        })
+        }
 
-class DashboardUsuariosAPI(APIView):
-    permission_classes = [permissions.IsAuthenticated]
-    
-    def get(self, request):
-        # Verificar permisos
-        user = request.user
-        if not (user.is_superuser or user.groups.filter(name__in=['Administrador', 'Gerente']).exists()):
-            return Response({"error": "No tienes permisos para ver el dashboard"}, status=status.HTTP_403_FORBIDDEN)
-        
-        # Obtener período desde los parámetros de la consulta
-        periodo = request.query_params.get('periodo', 'semana')
-        
-        # Definir días atrás según el período
-        if periodo == 'dia':
-            dias_atras = 1
-        elif periodo == 'semana':
-            dias_atras = 7
-        elif periodo == 'mes':
-            dias_atras = 30
-        elif periodo == 'trimestre':
-            dias_atras = 90
-        else:
-            dias_atras = 7
-        
-        fecha_inicio = timezone.now() - timedelta(days=dias_atras)
-        
-        # Usuarios con más ventas en el período
-        usuarios_rendimiento = User.objects.filter(
-            pedido__fecha_creacion__gte=fecha_inicio
+class DashboardUsuariosAPI(DashboardAPIView):
+    endpoint = 'usuarios'
+
+    def calcular(self, desde):
+        # Usuarios con más ventas en el período, leídos del rollup por hora
+        usuarios_rendimiento = ResumenVentaHora.objects.filter(
+            fecha__gte=desde
+        ).values(
+            'usuario_id', 'usuario__username', 'usuario__first_name', 'usuario__last_name'
         ).annotate(
-            total_ventas=Sum('pedido__total'),
-            pedidos_atendidos=Count('pedido')
-        ).order_by('-total_ventas')[:5]
+            total_ventas=Sum('total_ventas'),
+            pedidos_atendidos=Sum('cantidad_pedidos')
+        ).filter(pedidos_atendidos__gt=0).order_by('-total_ventas')[:5]
         
-        return Response({
+        return {
             'usuarios_rendimiento': [
                 {
-                    'id': usuario.id,
-                    'username': usuario.username,
-                    'nombre': f"{usuario.first_name} {usuario.last_name}".strip() or usuario.username,
-                    'total_ventas': usuario.total_ventas or 0,
-                    'pedidos_atendidos': usuario.pedidos_atendidos
+                    'id': usuario['usuario_id'],
+                    'username': usuario['usuario__username'],
+                    'nombre': f"{usuario['usuario__first_name']} {usuario['usuario__last_name']}".strip() or usuario['usuario__username'],
+                    'total_ventas': usuario['total_ventas'] or 0,
+                    'pedidos_atendidos': usuario['pedidos_atendidos']
                 }
                 for usuario in usuarios_rendimiento
             ]
-        })
+        }
+
+class SyncAPI(APIView):
+    """
+    Cambios de pedidos y órdenes desde un token: /core/sync/?since=<token>.
+    Sin `since` devuelve todo (sincronización inicial). Ver core.sync.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limite = min(int(request.query_params.get('limite', sync.LIMITE_POR_DEFECTO)), sync.LIMITE_MAXIMO)
+        except ValueError:
+            return Response({"error": "Parámetros 'since' y 'limite' deben ser enteros"}, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0 or limite < 1:
+            return Response({"error": "Parámetros 'since' y 'limite' fuera de rango"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(sync.cambios_desde(since, limite))
+
+class MetricasAPI(APIView):
+    """Métricas del proceso en formato de texto de Prometheus (ver core.metricas)"""
+    permission_classes = [TokenMetricas | IsGerente]
+
+    def get(self, request):
+        return HttpResponse(metricas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+class EagerLoadingMixin:
+    """
+    Aplica select_related/prefetch_related según la acción activa del viewset.
+
+    `eager_loading` mapea el nombre de la acción a un par
+    (select_related, prefetch_related); la clave '*' cubre las acciones no
+    listadas. Así cada serializer recibe sus relaciones ya cargadas y el
+    número de consultas no crece con el número de filas.
+    """
+    eager_loading = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        select_related, prefetch_related = self.eager_loading.get(
+            self.action, self.eager_loading.get('*', ((), ()))
+        )
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+class ValuesListMixin:
+    """
+    Camino rápido para `list`: si el viewset define `values_serializer_class`,
+    el listado se construye desde `.values()` (ver core.values_serializers)
+    con la misma forma JSON que el serializer normal.
+    """
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        if self.values_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+
+        values_serializer = self.values_serializer_class()
+        filas = values_serializer.valores(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(filas)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.serializar(page))
+        return Response(values_serializer.serializar(filas))
+
+class CatalogoCacheMixin:
+    """
+    Política de caché de los endpoints de catálogo. `list` y `retrieve`
+    responden con ETag fuerte y Last-Modified derivados de la versión del
+    catálogo (core.catalogo.marca), contestan 304 a If-None-Match o
+    If-Modified-Since sin tocar la base ni serializar, y guardan el cuerpo
+    renderizado en la caché `catalogo` hasta que la versión cambie. Solo
+    aplica a JSON: la API navegable incluye datos del usuario.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self._respuesta_cacheada(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._respuesta_cacheada(super().retrieve, request, *args, **kwargs)
+
+    def _respuesta_cacheada(self, generar, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return generar(request, *args, **kwargs)
+
+        version, actualizado = catalogo.marca()
+        # La fecha junto al contador: si la base se restaura, el contador puede repetirse
+        sello = f"{version}.{int(actualizado.timestamp() * 1000000) if actualizado else 0}"
+        # La URL completa distingue ítem, filtros y página (los enlaces del cursor son absolutos)
+        huella = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()[:16]
+        etag = f'"{sello}-{huella}"'
+        ultima = int(actualizado.timestamp()) if actualizado else None
+
+        respuesta = get_conditional_response(request._request, etag=etag, last_modified=ultima)
+        if respuesta is None:
+            clave = f"catalogo:{sello}:{huella}"
+            guardada = caches['catalogo'].get(clave)
+            if guardada is None:
+                generada = generar(request, *args, **kwargs)
+                if generada.status_code != status.HTTP_200_OK:
+                    return generada
+                self.finalize_response(request, generada, *args, **kwargs)
+                guardada = (generada.render().content, generada['Content-Type'])
+                caches['catalogo'].set(clave, guardada)
+            respuesta = HttpResponse(guardada[0], content_type=guardada[1])
+
+        respuesta['ETag'] = etag
+        if ultima is not None:
+            respuesta['Last-Modified'] = http_date(ultima)
+        # El cliente puede guardarla pero debe revalidar siempre (DisableAPICache la respeta)
+        respuesta['Cache-Control'] = 'private, no-cache'
+        return respuesta
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
-    permission_classes = [permissions.IsAuthenticated, DjangoModelPermissions]
+    permission_classes = [permissions.IsAuthenticated, PermisosModelo]
+    pagination_class = IdCursorPagination
+    # UserSerializer lee los grupos tanto en `groups` como en `grupos`
+    eager_loading = {'*': ((), ('groups',))}
+    # `me` serializa el usuario: con JWT_SIN_ESTADO necesita la fila completa
+    usuario_completo = {'me': True}
     
     def get_queryset(self):
+        queryset = super().get_queryset()
         # Si es superusuario o está en grupo Administrador puede ver todos los usuarios
-        user = self.request.user
-        if user.is_superuser or user.groups.filter(name='Administrador').exists():
-            return User.objects.all()
+        if IsAdministrador().has_permission(self.request, self):
+            return queryset
         # Si no, solo puede ver su propio perfil
-        return User.objects.filter(id=user.id)
+        return queryset.filter(id=self.request.user.id)
 
     @action(detail=False, methods=['get'])
     def me(self, request):
         """Endpoint para obtener información del usuario actual y sus permisos"""
         user = request.user
-        permisos = user.get_all_permissions()
-        grupos = [group.name for group in user.groups.all()]
+        # Grupos y permisos desde la caché de roles
+        roles_usuario = roles.de_usuario(user)
         
         serializer = self.get_serializer(user)
         data = serializer.data
-        data['permisos'] = list(permisos)
-        data['grupos'] = grupos
+        data['permisos'] = sorted(roles_usuario.permisos)
+        data['grupos'] = sorted(roles_usuario.grupos)
         
         return Response(data)
 
-class GroupViewSet(viewsets.ModelViewSet):
+class GroupViewSet(CatalogoCacheMixin, viewsets.ModelViewSet):
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
-    permission_classes = [permissions.IsAuthenticated, DjangoModelPermissions]
+    permission_classes = [permissions.IsAuthenticated, PermisosModelo]
 
-class ComponenteViewSet(viewsets.ModelViewSet):
+class ComponenteViewSet(CatalogoCacheMixin, viewsets.ModelViewSet):
     queryset = Componente.objects.all()
     serializer_class = ComponenteSerializer
-    permission_classes = [permissions.IsAuthenticated, DjangoModelPermissions]
+    permission_classes = [permissions.IsAuthenticated, PermisosModelo]
 
-class MenuItemViewSet(viewsets.ModelViewSet):
+class MenuItemViewSet(CatalogoCacheMixin, ValuesListMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = MenuItem.objects.all()
     serializer_class = MenuItemSerializer
-    permission_classes = [permissions.IsAuthenticated, DjangoModelPermissions]
+    values_serializer_class = MenuItemValuesSerializer
+    permission_classes = [permissions.IsAuthenticated, PermisosModelo]
+    pagination_class = IdCursorPagination
+    # MenuItemDetailSerializer anida los componentes en todas las acciones (ordenados
+    # por id, igual que el listado rápido)
+    eager_loading = {'*': ((), (Prefetch('componentes', queryset=Componente.objects.order_by('id')),))}
     
     def get_serializer_class(self):
         # Always return the detail serializer to include componentes
         return MenuItemDetailSerializer
     
-    # Ensure consistent response format for list
-    def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
-    
-    # Ensure proper data format for single item
-    def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
-    
     @action(detail=True, methods=['post'])
     def add_componente(self, request, pk=None):
         # Verificar permiso para modificar MenuItem
-        if not request.user.has_perm('core.change_menuitem'):
+        if not roles.tiene_permiso(request.user, 'core.change_menuitem'):
             return Response({'error': 'No tiene permisos para modificar ítems del menú'}, 
                           status=status.HTTP_403_FORBIDDEN)
             
@@ -310,7 +428,7 @@ class MenuItemViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def remove_componente(self, request, pk=None):
         # Verificar permiso para modificar MenuItem
-        if not request.user.has_perm('core.change_menuitem'):
+        if not roles.tiene_permiso(request.user, 'core.change_menuitem'):
             return Response({'error': 'No tiene permisos para modificar ítems del menú'}, 
                           status=status.HTTP_403_FORBIDDEN)
             
@@ -323,40 +441,68 @@ class MenuItemViewSet(viewsets.ModelViewSet):
         except Componente.DoesNotExist:
             return Response({'error': 'Componente not found'}, status=status.HTTP_404_NOT_FOUND)
 
-class EstadoViewSet(viewsets.ModelViewSet):
+class EstadoViewSet(CatalogoCacheMixin, viewsets.ModelViewSet):
     queryset = Estado.objects.all()
     serializer_class = EstadoSerializer
-    permission_classes = [permissions.IsAuthenticated, DjangoModelPermissions]
+    permission_classes = [permissions.IsAuthenticated, PermisosModelo]
 
-class MesaViewSet(viewsets.ModelViewSet):
+class MesaViewSet(CatalogoCacheMixin, viewsets.ModelViewSet):
     queryset = Mesa.objects.all()
     serializer_class = MesaSerializer
-    permission_classes = [permissions.IsAuthenticated, DjangoModelPermissions]
+    permission_classes = [permissions.IsAuthenticated, PermisosModelo]
 
 class ClienteViewSet(viewsets.ModelViewSet):
     queryset = Cliente.objects.all()
     serializer_class = ClienteSerializer
-    permission_classes = [permissions.IsAuthenticated, DjangoModelPermissions]
+    permission_classes = [permissions.IsAuthenticated, PermisosModelo]
+    pagination_class = IdCursorPagination
 
-class PedidoViewSet(viewsets.ModelViewSet):
+def _parametro_id(request, nombre):
+    try:
+        return int(request.query_params[nombre])
+    except ValueError:
+        raise ValidationError({'error': f"Parámetro '{nombre}' inválido"})
+
+class PedidoViewSet(ValuesListMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Pedido.objects.all()
     serializer_class = PedidoSerializer
-    permission_classes = [permissions.IsAuthenticated, DjangoModelPermissions]
+    values_serializer_class = PedidoValuesSerializer
+    permission_classes = [permissions.IsAuthenticated, PermisosModelo]
+    pagination_class = IdCursorPagination
+    eager_loading = {
+        # PedidoDetailSerializer anida mesa, cliente, usuario (con grupos) y órdenes
+        'retrieve': (('mesa', 'cliente', 'usuario'), ('ordenes', 'usuario__groups')),
+    }
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return PedidoDetailSerializer
+        if self.action == 'create':
+            # Acepta las órdenes del pedido en la misma petición
+            return PedidoCreateSerializer
         return PedidoSerializer
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+        # ?activos=1: solo los pedidos sin pagar (lo que muestra el tablero de mesas)
+        if self.request.query_params.get('activos') in ('1', 'true'):
+            queryset = queryset.filter(hora_pago__isnull=True)
+        if self.request.query_params.get('usuario'):
+            queryset = queryset.filter(usuario_id=_parametro_id(self.request, 'usuario'))
+        return queryset
+    
     def perform_create(self, serializer):
-        pedido = serializer.save(usuario=self.request.user)
-        # Emitir evento de socket.io
-        async_to_sync(emitir_pedido_creado)(str(pedido.id))
+        with transaction.atomic():
+            pedido = serializer.save(usuario=self.request.user)
+            # El evento de socket.io se publica después del commit (core.outbox)
+            outbox.registrar('pedido_creado', pedido.id)
     
     @action(detail=True, methods=['post'])
     def calcular_total(self, request, pk=None):
         # Verificar permiso para actualizar pedido
-        if not request.user.has_perm('core.change_pedido'):
+        if not roles.tiene_permiso(request.user, 'core.change_pedido'):
             return Response({'error': 'No tiene permisos para actualizar pedidos'}, 
                           status=status.HTTP_403_FORBIDDEN)
         
@@ -364,38 +510,147 @@ class PedidoViewSet(viewsets.ModelViewSet):
         pedido.calcular_total()
         return Response({'status': 'total calculado', 'subtotal': pedido.subtotal, 'total': pedido.total})
 
-class OrdenViewSet(viewsets.ModelViewSet):
+class OrdenViewSet(ValuesListMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Orden.objects.all()
     serializer_class = OrdenSerializer
-    permission_classes = [permissions.IsAuthenticated, DjangoModelPermissions]
+    values_serializer_class = OrdenValuesSerializer
+    permission_classes = [permissions.IsAuthenticated, PermisosModelo]
+    pagination_class = IdCursorPagination
+    # Cambiar estados solo necesita los roles: con JWT_SIN_ESTADO no se carga el usuario
+    usuario_completo = {'cambiar_estado': False, 'cambiar_estado_lote': False}
+    eager_loading = {
+        # OrdenDetailSerializer anida el ítem del menú (con componentes) y el estado
+        'retrieve': (('menu_item', 'estado'), ('menu_item__componentes',)),
+    }
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return OrdenDetailSerializer
         return OrdenSerializer
     
-    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # ?pedido=<id>: las órdenes de un pedido, sin recorrer todo el listado
+        if self.action == 'list' and self.request.query_params.get('pedido'):
+            queryset = queryset.filter(pedido_id=_parametro_id(self.request, 'pedido'))
+        return queryset
+    
+    @action(detail=False, methods=['get'])
+    def cola(self, request):
+        """
+        Cola de cocina: órdenes no terminadas agrupadas por estado y en orden de
+        llegada, con el nombre del ítem y el número de mesa ya resueltos.
+        Filtros opcionales: ?estado=<id>[,<id>...] y ?desde=HH:MM[:SS].
+        """
+        # Estados, ítems y mesas salen del catálogo en memoria: la consulta no los une
+        estados = [estado for estado in catalogo.estados() if not estado.terminado]
+        if request.query_params.get('estado'):
+            try:
+                ids = {int(valor) for valor in request.query_params['estado'].split(',')}
+            except ValueError:
+                return Response({"error": "Parámetro 'estado' inválido"}, status=status.HTTP_400_BAD_REQUEST)
+            estados = [estado for estado in estados if estado.id in ids]
+
+        # Filtrar por los ids de estado activos para usar el índice (estado, hora_creacion)
+        ordenes = Orden.objects.filter(estado_id__in=[estado.id for estado in estados])
+        if request.query_params.get('desde'):
+            try:
+                desde = time.fromisoformat(request.query_params['desde'])
+            except ValueError:
+                return Response({"error": "Parámetro 'desde' inválido, formato esperado HH:MM[:SS]"}, status=status.HTTP_400_BAD_REQUEST)
+            ordenes = ordenes.filter(hora_creacion__gte=desde)
+
+        por_estado = {estado.id: {'id': estado.id, 'nombre': estado.nombre, 'ordenes': []} for estado in estados}
+        filas = ordenes.order_by('hora_creacion', 'id').values(
+            'id', 'estado_id', 'pedido_id', 'menu_item_id', 'pedido__mesa_id', 'anotacion', 'hora_creacion'
+        )
+        for fila in filas:
+            menu_item = catalogo.menu_item(fila['menu_item_id'])
+            mesa = catalogo.mesa(fila['pedido__mesa_id'])
+            por_estado[fila['estado_id']]['ordenes'].append({
+                'id': fila['id'],
+                'pedido': fila['pedido_id'],
+                'menu_item': {'id': fila['menu_item_id'], 'nombre': menu_item.nombre if menu_item else None},
+                'mesa': {'id': fila['pedido__mesa_id'], 'numero': mesa.numero if mesa else None},
+                'anotacion': fila['anotacion'],
+                'hora_creacion': fila['hora_creacion'].isoformat() if fila['hora_creacion'] else None,
+            })
+
+        grupos = list(por_estado.values())
+        return Response({
+            'estados': grupos,
+            'total': sum(len(grupo['ordenes']) for grupo in grupos)
+        })
+
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated, PuedeCambiarOrdenes])
     def cambiar_estado(self, request, pk=None):
-        # Verificar permiso
-        if not (request.user.groups.filter(name='Cocinero').exists() or request.user.has_perm('core.change_orden')):
-            return Response({"error": "No tienes permiso para cambiar estados"}, status=status.HTTP_403_FORBIDDEN)
-        
         orden = self.get_object()
         estado_id = request.data.get('estado_id')
         
-        try:
-            estado = Estado.objects.get(id=estado_id)
-            orden.estado = estado
-            
-            # Si el estado es "Listo", registrar hora de entrega
-            if estado.nombre == 'Listo':
-                orden.hora_entrega = timezone.now()
-                
+        estado = catalogo.estado(estado_id)
+        if estado is None:
+            return Response({"error": "Estado no encontrado"}, status=status.HTTP_404_NOT_FOUND)
+        orden.estado_id = estado.id
+
+        # Si el estado es "Listo", registrar hora de entrega
+        if estado.nombre == 'Listo':
+            orden.hora_entrega = timezone.now()
+
+        with transaction.atomic():
             orden.save()
-            
-            # Ejecutar la tarea asíncrona para emitir el evento
-            async_to_sync(emitir_orden_actualizada)(str(orden.id))
-            
-            return Response({"status": "Estado actualizado", "estado": estado.nombre})
-        except Estado.DoesNotExist:
-            return Response({"error": "Estado no encontrado"}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            # El evento de socket.io se publica después del commit (core.outbox)
+            outbox.registrar('orden_actualizada', orden.id)
+
+        return Response({"status": "Estado actualizado", "estado": estado.nombre})
+
+    LOTE_MAXIMO = 500
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, PuedeCambiarOrdenes])
+    def cambiar_estado_lote(self, request):
+        """
+        Cambia el estado de varias órdenes con un solo UPDATE.
+        Cuerpo: {"ids": [...], "estado_id": <id>}. Los ids inválidos o inexistentes
+        se informan en `errores` sin impedir que se actualicen los demás.
+        """
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            return Response({"error": "Se esperaba una lista 'ids' no vacía"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > self.LOTE_MAXIMO:
+            return Response({"error": f"Máximo {self.LOTE_MAXIMO} órdenes por lote"}, status=status.HTTP_400_BAD_REQUEST)
+        estado = catalogo.estado(request.data.get('estado_id'))
+        if estado is None:
+            return Response({"error": "Estado no encontrado"}, status=status.HTTP_404_NOT_FOUND)
+
+        errores = {}
+        validos = []
+        for valor in ids:
+            try:
+                validos.append(int(valor))
+            except (TypeError, ValueError):
+                errores[str(valor)] = "Id inválido"
+        validos = list(dict.fromkeys(validos))
+
+        cambios = {'estado_id': estado.id}
+        # Si el estado es "Listo", registrar hora de entrega
+        if estado.nombre == 'Listo':
+            cambios['hora_entrega'] = timezone.now()
+
+        with transaction.atomic():
+            existentes = list(Orden.objects.filter(id__in=validos).order_by('id').values_list('id', flat=True))
+            if existentes:
+                # El UPDATE no dispara señales: versión de sincronización y caché de dashboards a mano
+                Orden.objects.filter(id__in=existentes).update(version=sync.versiones_por_id(existentes), **cambios)
+                dashboard.invalidar()
+                outbox.registrar_lote('orden_actualizada', existentes)
+
+        encontrados = set(existentes)
+        for orden_id in validos:
+            if orden_id not in encontrados:
+                errores[str(orden_id)] = "Orden no encontrada"
+
+        return Response({
+            "status": "Estados actualizados",
+            "estado": estado.nombre,
+            "actualizadas": existentes,
+            "errores": errores,
+        })
\ No newline at end of file
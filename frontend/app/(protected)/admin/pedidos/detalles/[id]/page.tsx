@@ -94,12 +94,8 @@ export default function PedidoFormPage() {
           // Si las órdenes no están incluidas, cargarlas por separado
           console.log('Cargando órdenes separadamente para el pedido ID:', id); // Añadir para debug
           
-          const ordenesResponse = await ordenesApi.getAll();
-          // Filtrar correctamente solo las órdenes del pedido actual
-          const pedidoOrdenes = ordenesResponse.filter(orden => {
-            const ordenPedidoId = typeof orden.pedido === 'object' && orden.pedido !== null ? (orden.pedido as { id: string }).id : orden.pedido;
-            return ordenPedidoId === id;
-          });
+          // El backend filtra por pedido: no se descarga el listado completo
+          const pedidoOrdenes = await ordenesApi.getDePedido(id);
           
           console.log('Órdenes encontradas para este pedido:', pedidoOrdenes); // Añadir para debug
           
@@ -3,7 +3,7 @@
 import { useState, useEffect } from 'react';
 import { useRouter } from 'next/navigation';
 import ProtectedRoute from '@/app/components/auth/ProtectedRoute';
-import { pedidosApi, ordenesApi, mesasApi, clientesApi, menuItemsApi, estadosApi } from '@/lib/api';
+import { pedidosApi, mesasApi, clientesApi, menuItemsApi, estadosApi } from '@/lib/api';
 import type { Mesa, Cliente, MenuItem, Estado } from '@/lib/api';
 import { getUserInfo } from '@/lib/auth'; // Importar función para obtener información del usuario
 
@@ -146,22 +146,12 @@ export default function CrearPedidoPage() {
       
       console.log('Enviando datos del pedido:', pedidoData);
       
-      const pedidoCreado = await pedidosApi.create(pedidoData);
-      
-      // 2. Crear las órdenes asociadas al pedido
-      const ordenPromises = formData.ordenes.map(orden => 
-        ordenesApi.create({
-          pedido: pedidoCreado.id,
-          menu_item: orden.menu_item,
-          anotacion: orden.anotacion,
-          estado: estadoInicial
-        })
-      );
-      
-      await Promise.all(ordenPromises);
-      
-      // 3. Calcular el total del pedido
-      await pedidosApi.calcularTotal(pedidoCreado.id);
+      // 2. Enviar las órdenes junto con el pedido; el backend calcula el total
+      await pedidosApi.createConOrdenes(pedidoData, formData.ordenes.map(orden => ({
+        menu_item: orden.menu_item,
+        anotacion: orden.anotacion,
+        estado: estadoInicial
+      })));
       
       setSuccessMessage('Pedido creado exitosamente');
       
@@ -2,7 +2,7 @@
 
 import { useState, useEffect, useCallback } from 'react';
 import { useSocket } from '@/app/context/SocketContext';
-import { ordenesApi, pedidosApi, estadosApi, Pedido, Orden, Estado } from '@/lib/api';
+import { ordenesApi, estadosApi, Estado, ColaCocinaResponse, OrdenEnCola } from '@/lib/api';
 import { 
   Button, Card, Chip, Divider, Badge, CircularProgress, 
   Grid, Paper, Typography, Box, Alert, IconButton
@@ -41,21 +41,16 @@ interface SocketOrdenActualizada {
   estado: string | { id: string; nombre: string };
 }
 
-interface PedidoConOrdenes extends Pedido {
-  ordenes: OrdenDetallada[];
+// Orden de la cola de cocina con el estado del grupo en el que llegó
+interface OrdenCocina extends OrdenEnCola {
+  estado: { id: number; nombre: string };
 }
 
-interface OrdenDetallada extends Orden { 
-  menu_item: {
-    id: string;
-    nombre: string;
-    precio: number;
-    descripcion?: string;
-  };
-  estado: {
-    id: string;
-    nombre: string;
-  };
+// Las órdenes de la cola agrupadas por pedido para mostrarlas como tarjetas
+interface PedidoCocina {
+  id: number;
+  mesa: { id: number; numero: number };
+  ordenes: OrdenCocina[];
 }
 
 // Constantes para los IDs de estados
@@ -63,8 +58,30 @@ const ESTADO_PENDIENTE_ID = 1;
 const ESTADO_PREPARACION_ID = 2;
 const ESTADO_ENTREGADO_ID = 3;
 
+// El backend ya devuelve solo estas órdenes, en orden de llegada
+const ESTADOS_COLA = `${ESTADO_PENDIENTE_ID},${ESTADO_PREPARACION_ID}`;
+
+const agruparPorPedido = (cola: ColaCocinaResponse): PedidoCocina[] => {
+  const porPedido = new Map<number, PedidoCocina>();
+  cola.estados.forEach(grupo => {
+    grupo.ordenes.forEach(orden => {
+      let pedido = porPedido.get(orden.pedido);
+      if (!pedido) {
+        pedido = { id: orden.pedido, mesa: orden.mesa, ordenes: [] };
+        porPedido.set(orden.pedido, pedido);
+      }
+      pedido.ordenes.push({ ...orden, estado: { id: grupo.id, nombre: grupo.nombre } });
+    });
+  });
+  const llegada = (orden: OrdenCocina) => `${orden.hora_creacion ?? ''}-${String(orden.id).padStart(10, '0')}`;
+  const pedidos = Array.from(porPedido.values());
+  pedidos.forEach(pedido => pedido.ordenes.sort((a, b) => llegada(a).localeCompare(llegada(b))));
+  // Primero el pedido con la orden más antigua
+  return pedidos.sort((a, b) => llegada(a.ordenes[0]).localeCompare(llegada(b.ordenes[0])));
+};
+
 export default function CocineroPage() {
-  const [pedidos, setPedidos] = useState<PedidoConOrdenes[]>([]);
+  const [pedidos, setPedidos] = useState<PedidoCocina[]>([]);
   const [loading, setLoading] = useState(true);
   const [estados, setEstados] = useState<Estado[]>([]);
   const { socket, isConnected } = useSocket();
@@ -78,29 +95,9 @@ export default function CocineroPage() {
   // Convertir actualizarPedidos a useCallback para mantener una referencia estable
   const actualizarPedidos = useCallback(async () => {
     try {
-      const pedidosData = await pedidosApi.getAll();
-      
-      const pedidosConDetalle = await Promise.all(
-        pedidosData
-          .filter(pedido => !pedido.hora_pago)
-          .map(async (pedido) => {
-            const detalles = await pedidosApi.getOne(pedido.id);
-            return detalles as PedidoConOrdenes;
-          })
-      );
-
-      // Filtrar usando IDs de estado en lugar de nombres
-      const pedidosFiltrados = pedidosConDetalle.filter(pedido => 
-        pedido.ordenes?.some(orden => {
-          const estadoId = typeof orden.estado === 'object' ? 
-            parseInt(orden.estado.id) : 
-            (typeof orden.estado === 'string' ? parseInt(orden.estado) : orden.estado);
-          
-          return estadoId === ESTADO_PENDIENTE_ID || estadoId === ESTADO_PREPARACION_ID;
-        })
-      );
-      
-      setPedidos(pedidosFiltrados);
+      // Una sola petición: la cola trae solo las órdenes activas, ya filtradas y ordenadas
+      const cola = await ordenesApi.cola({ estado: ESTADOS_COLA });
+      setPedidos(agruparPorPedido(cola));
     } catch (error) {
       console.error('Error actualizando pedidos:', error);
     }
@@ -112,7 +109,7 @@ export default function CocineroPage() {
       try {
         setLoading(true);
         
-        // Cargar los estados primero para poder usarlos en el filtrado
+        // Estados de destino de los botones (se buscan por nombre)
         const estadosData = await estadosApi.getAll();
         setEstados(estadosData);
         
@@ -174,7 +171,7 @@ export default function CocineroPage() {
   };
 
   // Nueva función para cambiar el estado de todas las órdenes de un pedido
-  const cambiarEstadoTodasOrdenes = async (pedidoId: string, nuevoEstadoNombre: string) => {
+  const cambiarEstadoTodasOrdenes = async (pedidoId: number, nuevoEstadoNombre: string) => {
     try {
       const pedido = pedidos.find(p => p.id === pedidoId);
       if (!pedido) {
@@ -193,20 +190,10 @@ export default function CocineroPage() {
       
       if (nuevoEstadoNombre === 'En Preparación') {
         // Solo cambiar a "En Preparación" las que están en "Pendiente"
-        ordenesAActualizar = pedido.ordenes.filter(orden => {
-          const estadoId = typeof orden.estado === 'object' ? 
-            parseInt(orden.estado.id) : 
-            (typeof orden.estado === 'string' ? parseInt(orden.estado) : orden.estado);
-          return estadoId === ESTADO_PENDIENTE_ID;
-        });
+        ordenesAActualizar = pedido.ordenes.filter(orden => orden.estado.id === ESTADO_PENDIENTE_ID);
       } else if (nuevoEstadoNombre === 'Entregado') {
         // Solo cambiar a "Entregado" las que están en "En Preparación"
-        ordenesAActualizar = pedido.ordenes.filter(orden => {
-          const estadoId = typeof orden.estado === 'object' ? 
-            parseInt(orden.estado.id) : 
-            (typeof orden.estado === 'string' ? parseInt(orden.estado) : orden.estado);
-          return estadoId === ESTADO_PREPARACION_ID;
-        });
+        ordenesAActualizar = pedido.ordenes.filter(orden => orden.estado.id === ESTADO_PREPARACION_ID);
       }
 
       if (ordenesAActualizar.length === 0) {
@@ -214,14 +201,19 @@ export default function CocineroPage() {
         return;
       }
 
-      // Actualizar todas las órdenes seleccionadas
-      const promises = ordenesAActualizar.map(orden => 
-        ordenesApi.cambiarEstado(orden.id, estado.id)
+      // Actualizar todas las órdenes seleccionadas en una sola petición
+      const resultado = await ordenesApi.cambiarEstadoLote(
+        ordenesAActualizar.map(orden => String(orden.id)),
+        estado.id
       );
       
-      await Promise.all(promises);
-      
-      toast.success(`${ordenesAActualizar.length} órdenes actualizadas a: ${nuevoEstadoNombre}`);
+      const fallidas = Object.keys(resultado.errores).length;
+      if (resultado.actualizadas.length > 0) {
+        toast.success(`${resultado.actualizadas.length} órdenes actualizadas a: ${nuevoEstadoNombre}`);
+      }
+      if (fallidas > 0) {
+        toast.error(`${fallidas} órdenes no se pudieron actualizar`);
+      }
       setTimeout(actualizarPedidos, 500);
     } catch (error) {
       console.error('Error al cambiar estados:', error);
@@ -272,26 +264,16 @@ export default function CocineroPage() {
   };
 
   // Obtener el siguiente estado para un pedido según sus órdenes actuales
-  const getSiguienteEstadoPedido = (pedido: PedidoConOrdenes) => {
+  const getSiguienteEstadoPedido = (pedido: PedidoCocina) => {
     // Si tiene órdenes pendientes, el siguiente estado es "En Preparación"
-    const tieneOrdenesPendientes = pedido.ordenes.some(orden => {
-      const estadoId = typeof orden.estado === 'object' ? 
-        parseInt(orden.estado.id) : 
-        (typeof orden.estado === 'string' ? parseInt(orden.estado) : orden.estado);
-      return estadoId === ESTADO_PENDIENTE_ID;
-    });
+    const tieneOrdenesPendientes = pedido.ordenes.some(orden => orden.estado.id === ESTADO_PENDIENTE_ID);
 
     if (tieneOrdenesPendientes) {
       return 'En Preparación';
     }
 
     // Si tiene órdenes en preparación, el siguiente estado es "Entregado"
-    const tieneOrdenesEnPreparacion = pedido.ordenes.some(orden => {
-      const estadoId = typeof orden.estado === 'object' ? 
-        parseInt(orden.estado.id) : 
-        (typeof orden.estado === 'string' ? parseInt(orden.estado) : orden.estado);
-      return estadoId === ESTADO_PREPARACION_ID;
-    });
+    const tieneOrdenesEnPreparacion = pedido.ordenes.some(orden => orden.estado.id === ESTADO_PREPARACION_ID);
 
     if (tieneOrdenesEnPreparacion) {
       return 'Entregado';
@@ -357,34 +339,10 @@ export default function CocineroPage() {
       ) : (
         <Grid container spacing={3}>
           {pedidos.map((pedido) => {
-            // Filtrar órdenes pendientes o en preparación para este pedido
-            const ordenesPendientesPreparacion = pedido.ordenes?.filter(orden => {
-              const estadoId = typeof orden.estado === 'object' ? 
-                parseInt(orden.estado.id) : 
-                (typeof orden.estado === 'string' ? parseInt(orden.estado) : orden.estado);
-              
-              return estadoId === ESTADO_PENDIENTE_ID || estadoId === ESTADO_PREPARACION_ID;
-            }) || [];
-
-            // Si no hay órdenes pendientes o en preparación, no mostrar el pedido
-            if (ordenesPendientesPreparacion.length === 0) {
-              return null;
-            }
-            
-            // Contar órdenes por estado
+            // Contar órdenes por estado (la cola solo trae pendientes y en preparación)
             const ordenesCount = {
-              pendientes: ordenesPendientesPreparacion.filter(o => {
-                const estadoId = typeof o.estado === 'object' ? 
-                  parseInt(o.estado.id) : 
-                  (typeof o.estado === 'string' ? parseInt(o.estado) : o.estado);
-                return estadoId === ESTADO_PENDIENTE_ID;
-              }).length,
-              enPreparacion: ordenesPendientesPreparacion.filter(o => {
-                const estadoId = typeof o.estado === 'object' ? 
-                  parseInt(o.estado.id) : 
-                  (typeof o.estado === 'string' ? parseInt(o.estado) : o.estado);
-                return estadoId === ESTADO_PREPARACION_ID;
-              }).length
+              pendientes: pedido.ordenes.filter(o => o.estado.id === ESTADO_PENDIENTE_ID).length,
+              enPreparacion: pedido.ordenes.filter(o => o.estado.id === ESTADO_PREPARACION_ID).length
             };
 
             // Determinar el siguiente estado para todo el pedido
@@ -455,12 +413,9 @@ export default function CocineroPage() {
                   
                   {/* Lista de órdenes */}
                   <Grid container spacing={2}>
-                    {ordenesPendientesPreparacion.map((orden) => {
+                    {pedido.ordenes.map((orden) => {
                       // Obtener el nombre del estado
-                      const estadoId = typeof orden.estado === 'object' ? 
-                        parseInt(orden.estado.id) : 
-                        (typeof orden.estado === 'string' ? parseInt(orden.estado) : orden.estado);
-                      
+                      const estadoId = orden.estado.id;
                       const estadoNombre = getNombreEstado(estadoId);
                       
                       return (
@@ -516,7 +471,7 @@ export default function CocineroPage() {
                                   variant="outlined"
                                   color="primary"
                                   size="small"
-                                  onClick={() => cambiarEstadoOrden(orden.id, 'En Preparación')}
+                                  onClick={() => cambiarEstadoOrden(String(orden.id), 'En Preparación')}
                                 >
                                   Preparar
                                 </Button>
@@ -526,7 +481,7 @@ export default function CocineroPage() {
                                   variant="outlined"
                                   color="success"
                                   size="small"
-                                  onClick={() => cambiarEstadoOrden(orden.id, 'Entregado')}
+                                  onClick={() => cambiarEstadoOrden(String(orden.id), 'Entregado')}
                                 >
                                   Entregar
                                 </Button>
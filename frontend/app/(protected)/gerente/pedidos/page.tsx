@@ -10,6 +10,9 @@ import { es } from 'date-fns/locale';
 
 export default function PedidosPage() {
   const [pedidos, setPedidos] = useState<Pedido[]>([]);
+  // URL de la página siguiente del listado paginado (null si no hay más)
+  const [siguiente, setSiguiente] = useState<string | null>(null);
+  const [cargandoMas, setCargandoMas] = useState(false);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const router = useRouter();
@@ -19,8 +22,9 @@ export default function PedidosPage() {
     setError(null);
     
     try {
-      const data = await pedidosApi.getAll();
-      setPedidos(data);
+      const pagina = await pedidosApi.getPage();
+      setPedidos(pagina.items);
+      setSiguiente(pagina.next);
     } catch (error) {
       console.error('Error fetching pedidos:', error);
       setError('Error al cargar los pedidos. Por favor, inténtalo de nuevo.');
@@ -29,6 +33,21 @@ export default function PedidosPage() {
     }
   };
 
+  const cargarMas = async () => {
+    if (!siguiente) return;
+    setCargandoMas(true);
+    try {
+      const pagina = await pedidosApi.getPage(siguiente);
+      setPedidos(prev => [...prev, ...pagina.items]);
+      setSiguiente(pagina.next);
+    } catch (error) {
+      console.error('Error fetching pedidos:', error);
+      setError('Error al cargar más pedidos. Por favor, inténtalo de nuevo.');
+    } finally {
+      setCargandoMas(false);
+    }
+  };
+
   useEffect(() => {
     fetchPedidos();
   }, []);
@@ -252,6 +271,18 @@ export default function PedidosPage() {
             )}
           </div>
         )}
+
+        {!isLoading && siguiente && (
+          <div className="flex justify-center mt-6">
+            <button
+              onClick={cargarMas}
+              disabled={cargandoMas}
+              className="bg-gray-100 hover:bg-gray-200 text-gray-700 px-4 py-2 rounded-md disabled:opacity-50"
+            >
+              {cargandoMas ? 'Cargando...' : 'Cargar más'}
+            </button>
+          </div>
+        )}
       </div>
     </ProtectedRoute>
   );
@@ -16,6 +16,7 @@ import {
   Estado,
   Orden,
   Cliente,
+  LineaPedido,
 } from '@/lib/api';
 import { toast } from 'react-hot-toast';
 import { useSocket } from '@/app/context/SocketContext';
@@ -66,7 +67,8 @@ function PedidosManager() {
       try {
         const [mesasData, pedidosData, menuItemsData, estadosData, clientesData] = await Promise.all([
           mesasApi.getAll(),
-          pedidosApi.getAll(),
+          // Solo los pedidos sin pagar: son los que ocupan mesa
+          pedidosApi.getActivos(),
           menuItemsApi.getAll(),
           estadosApi.getAll(),
           clientesApi.getAll()
@@ -295,46 +297,34 @@ function PedidosManager() {
     }
     
     try {
-      // 1. Crear el pedido con el ID de usuario
-      const nuevoPedido = await pedidosApi.create({
-        mesa: selectedMesa.id,
-        subtotal: 0, // Se calculará automáticamente
-        total: 0,     // Se calculará automáticamente
-        usuario: userId
-      });
-      
-      // 2. Crear las órdenes
       const estadoPendiente = estados.find(e => e.nombre === 'Pendiente');
       
       if (!estadoPendiente) {
         throw new Error('Estado Pendiente no encontrado');
       }
       
-      // Crear todas las órdenes
-      const ordenesPromises = [];
+      // 1. Crear el pedido con todas sus órdenes; el total se calcula en el backend
+      const lineas: LineaPedido[] = [];
       
       for (const tempOrden of tempOrdenes) {
         for (let i = 0; i < tempOrden.cantidad; i++) {
-          ordenesPromises.push(
-            ordenesApi.create({
-              pedido: nuevoPedido.id,
-              menu_item: tempOrden.menuItem.id,
-              estado: estadoPendiente.id,
-              anotacion: tempOrden.anotacion
-            })
-          );
+          lineas.push({
+            menu_item: tempOrden.menuItem.id,
+            estado: estadoPendiente.id,
+            anotacion: tempOrden.anotacion
+          });
         }
       }
       
-      await Promise.all(ordenesPromises);
-      
-      // 3. Calcular el total del pedido
-      await pedidosApi.calcularTotal(nuevoPedido.id);
+      const nuevoPedido = await pedidosApi.createConOrdenes({
+        mesa: selectedMesa.id,
+        usuario: userId
+      }, lineas);
       
-      // 4. Cargar el pedido completo
+      // 2. Cargar el pedido completo
       const pedidoCompleto = await pedidosApi.getOne(nuevoPedido.id);
       
-      // 5. Actualizar estados
+      // 3. Actualizar estados
       setCurrentPedido(pedidoCompleto);
       setPedidos(prev => [...prev, pedidoCompleto]);
       setTempOrdenes([]);
@@ -151,19 +151,57 @@ export interface Pedido {
   ordenes?: Orden[];
 }
 
+// Respuesta de los listados paginados por cursor del backend
+interface PaginaCursor<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
+// Una página de un listado: `next` es la URL de la página siguiente (null si es la última)
+export interface Pagina<T> {
+  items: T[];
+  next: string | null;
+}
+
 // Funciones genéricas CRUD actualizadas con el prefijo
-const fetchAll = async <T>(endpoint: string): Promise<T[]> => {
+// `filtros` van como query params a la primera página; `next` ya los conserva
+const fetchPage = async <T>(
+  endpoint: string,
+  next: string | null = null,
+  pageSize?: number,
+  filtros: Record<string, string> = {}
+): Promise<Pagina<T>> => {
   const url = endpoint.startsWith('/') ? `${API_PREFIX}${endpoint}` : `${API_PREFIX}/${endpoint}`;
-  console.log('Fetching from:', API_URL + url);
+  console.log('Fetching from:', next ?? API_URL + url);
   try {
-    const response = await api.get<T[]>(url);
-    return response.data;
+    // `next` ya trae el cursor y el tamaño de página
+    const response = next
+      ? await api.get<PaginaCursor<T>>(next)
+      : await api.get<T[] | PaginaCursor<T>>(url, { params: pageSize ? { ...filtros, page_size: pageSize } : filtros });
+    if (Array.isArray(response.data)) {
+      return { items: response.data, next: null };
+    }
+    return { items: response.data.results, next: response.data.next };
   } catch (error) {
     console.error('Error fetching data:', error);
     throw error;
   }
 };
 
+// Todas las páginas: solo para conjuntos acotados (catálogos, selectores de
+// formularios, listados filtrados en el servidor). Las vistas de listado usan
+// getPage y piden más a demanda
+const fetchAll = async <T>(endpoint: string, filtros: Record<string, string> = {}): Promise<T[]> => {
+  let pagina = await fetchPage<T>(endpoint, null, undefined, filtros);
+  const items = [...pagina.items];
+  while (pagina.next) {
+    pagina = await fetchPage<T>(endpoint, pagina.next);
+    items.push(...pagina.items);
+  }
+  return items;
+};
+
 const fetchOne = async <T>(endpoint: string, id: string): Promise<T> => {
   const url = endpoint.startsWith('/') ? `${API_PREFIX}${endpoint}` : `${API_PREFIX}/${endpoint}`;
   const response = await api.get<T>(`${url}/${id}/`);
@@ -203,6 +241,7 @@ export const componentesApi = {
 
 export const menuItemsApi = {
   getAll: () => fetchAll<MenuItem>('/menu-items'),
+  getPage: (next: string | null = null, pageSize?: number) => fetchPage<MenuItem>('/menu-items', next, pageSize),
   getOne: (id: string) => fetchOne<MenuItem>('/menu-items', id),
   create: (data: Partial<MenuItem>) => create<MenuItem>('/menu-items/', data),
   update: (id: string, data: Partial<MenuItem>) => update<MenuItem>('/menu-items', id, data),
@@ -231,6 +270,7 @@ export const mesasApi = {
 
 export const clientesApi = {
   getAll: () => fetchAll<Cliente>('/clientes'),
+  getPage: (next: string | null = null, pageSize?: number) => fetchPage<Cliente>('/clientes', next, pageSize),
   getOne: (id: string) => fetchOne<Cliente>('/clientes', id),
   create: (data: Partial<Cliente>) => create<Cliente>('/clientes/', data),
   update: (id: string, data: Partial<Cliente>) => update<Cliente>('/clientes', id, data),
@@ -239,23 +279,65 @@ export const clientesApi = {
 
 export const pedidosApi = {
   getAll: () => fetchAll<Pedido>('/pedidos'),
+  getPage: (next: string | null = null, pageSize?: number) => fetchPage<Pedido>('/pedidos', next, pageSize),
+  // Pedidos sin pagar: acotados por el número de mesas
+  getActivos: () => fetchAll<Pedido>('/pedidos', { activos: '1' }),
   getOne: (id: string) => fetchOne<Pedido>('/pedidos', id),
   create: (data: Partial<Pedido>) => create<Pedido>('/pedidos/', data),
   update: (id: string, data: Partial<Pedido>) => update<Pedido>('/pedidos', id, data),
   delete: (id: string) => remove('/pedidos', id),
-  calcularTotal: (id: string) => api.post(`${API_PREFIX}/pedidos/${id}/calcular_total/`).then(res => res.data)
+  calcularTotal: (id: string) => api.post(`${API_PREFIX}/pedidos/${id}/calcular_total/`).then(res => res.data),
+  // Crea el pedido y sus órdenes en una sola petición; el backend calcula el total
+  createConOrdenes: (data: Partial<Pedido>, ordenes: LineaPedido[]) =>
+    create<Pedido>('/pedidos/', { ...data, ordenes })
 };
 
+// Orden enviada junto con un pedido nuevo
+export interface LineaPedido {
+  menu_item: string | number;
+  estado: string | number;
+  anotacion?: string;
+}
+
+// Cola de cocina: órdenes no terminadas agrupadas por estado
+export interface OrdenEnCola {
+  id: number;
+  pedido: number;
+  menu_item: { id: number; nombre: string };
+  mesa: { id: number; numero: number };
+  anotacion: string | null;
+  hora_creacion: string | null;
+}
+
+export interface ColaCocinaResponse {
+  estados: { id: number; nombre: string; ordenes: OrdenEnCola[] }[];
+  total: number;
+}
+
 export const ordenesApi = {
   getAll: () => fetchAll<Orden>('/ordenes'),
+  getPage: (next: string | null = null, pageSize?: number) => fetchPage<Orden>('/ordenes', next, pageSize),
+  getDePedido: (pedidoId: string) => fetchAll<Orden>('/ordenes', { pedido: pedidoId }),
+  cola: (params: { estado?: string; desde?: string } = {}) =>
+    api.get<ColaCocinaResponse>(`${API_PREFIX}/ordenes/cola/`, { params }).then(res => res.data),
   getOne: (id: string) => fetchOne<Orden>('/ordenes', id),
   create: (data: Partial<Orden>) => create<Orden>('/ordenes/', data),
   update: (id: string, data: Partial<Orden>) => update<Orden>('/ordenes', id, data),
   delete: (id: string) => remove('/ordenes', id),
   cambiarEstado: (id: string, estadoId: string) => 
-    api.post(`${API_PREFIX}/ordenes/${id}/cambiar_estado/`, { estado_id: estadoId }).then(res => res.data)
+    api.post(`${API_PREFIX}/ordenes/${id}/cambiar_estado/`, { estado_id: estadoId }).then(res => res.data),
+  cambiarEstadoLote: (ids: string[], estadoId: string) =>
+    api.post<CambioEstadoLoteResponse>(`${API_PREFIX}/ordenes/cambiar_estado_lote/`, { ids, estado_id: estadoId }).then(res => res.data)
 };
 
+// Resultado de un cambio de estado en lote: errores por id de orden
+export interface CambioEstadoLoteResponse {
+  status: string;
+  estado: string;
+  actualizadas: number[];
+  errores: Record<string, string>;
+}
+
 // Interfaces para el dashboard
 export interface VentasPorPeriodo {
   periodo: string;